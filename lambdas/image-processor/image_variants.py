@@ -0,0 +1,95 @@
+"""
+Resize pipeline for the image-processor Lambda.
+
+The original is decoded once and every size is derived from it as a
+cascade: large from the original, medium from large, small from medium,
+thumbnail from small. Each step resamples an image only a little larger
+than its target rather than the full original. JPEG originals are decoded
+in draft mode: libjpeg scales by 1/2, 1/4 or 1/8 while decoding, so a 24
+megapixel photo destined for a 1200px variant never has all its pixels
+decoded. Draft and reduce keep at least REDUCING_GAP times the target
+size, so the final LANCZOS step still has the detail to work with.
+
+Only Pillow is needed here, so the pipeline can be benchmarked without AWS
+(tests/load/bench_image_processor.py).
+"""
+
+import io
+
+from PIL import Image
+
+# Largest first: the order the cascade runs in
+SIZES = {
+    'large': (1200, 1200),
+    'medium': (800, 800),
+    'small': (400, 400),
+    'thumbnail': (150, 150)
+}
+
+JPEG_QUALITY = 85
+
+# How much larger than the target draft decoding and integer reduction may
+# leave the image before the LANCZOS resample
+REDUCING_GAP = 2.0
+
+
+def fit_size(size, box):
+    """Scale size to fit box, keeping the aspect ratio (may scale up)"""
+    width, height = size
+    scaling_factor = min(box[0] / width, box[1] / height)
+    return max(1, int(width * scaling_factor)), max(1, int(height * scaling_factor))
+
+
+def open_image(fp, sizes=SIZES):
+    """
+    Open an image for resizing to sizes; returns (image, original_size).
+    Only the header is read. JPEGs are set to decode only at the resolution
+    the largest size needs. Images over Image.MAX_IMAGE_PIXELS are refused.
+    """
+    image = Image.open(fp)
+    original_size = image.size
+    # Pillow only warns between MAX_IMAGE_PIXELS and twice that
+    if Image.MAX_IMAGE_PIXELS and original_size[0] * original_size[1] > Image.MAX_IMAGE_PIXELS:
+        image.close()
+        raise Image.DecompressionBombError(
+            f"Image size {original_size[0]}x{original_size[1]} exceeds the limit of {Image.MAX_IMAGE_PIXELS} pixels"
+        )
+    if image.format == 'JPEG':
+        largest = max((fit_size(original_size, box) for box in sizes.values()), key=lambda s: s[0] * s[1])
+        image.draft('RGB', (int(largest[0] * REDUCING_GAP), int(largest[1] * REDUCING_GAP)))
+    if image.mode not in ('RGB', 'L'):
+        # JPEG output has no alpha or palette
+        image = image.convert('RGB')
+    return image, original_size
+
+
+def resize_cascade(image, original_size, sizes=SIZES):
+    """
+    Yield (size_name, resized image) from the largest size to the smallest,
+    each resized from the smallest image so far that is at least as large
+    """
+    targets = sorted(
+        ((name, fit_size(original_size, box)) for name, box in sizes.items()),
+        key=lambda item: item[1][0] * item[1][1],
+        reverse=True
+    )
+    source = image
+    for name, target in targets:
+        resized = source.resize(target, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+        yield name, resized
+        # Upscaled variants are not used as sources; the next one starts from
+        # the original again
+        if target[0] <= image.size[0] and target[1] <= image.size[1]:
+            source = resized
+
+
+def encode_jpeg(image):
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return output_buffer.getvalue()
+
+
+def render_variants(fp, sizes=SIZES):
+    """Decode once and encode every size; returns (original_size, {size_name: jpeg bytes})"""
+    image, original_size = open_image(fp, sizes)
+    return original_size, {name: encode_jpeg(resized) for name, resized in resize_cascade(image, original_size, sizes)}
@@ -1,19 +1,105 @@
 import json
 import boto3
+import hashlib
 import logging
 import os
 import urllib.parse
-from PIL import Image
 import io
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from botocore.config import Config
+from PIL import Image
+
+from image_variants import SIZES, encode_jpeg, open_image, resize_cascade
+from variant_cache import index_from_env
 
 # Setup logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-s3_client = boto3.client('s3')
+# Records processed at once per invocation, and threads encoding and
+# uploading variants (Pillow and botocore release the GIL)
+RECORD_CONCURRENCY = int(os.environ.get('RECORD_CONCURRENCY', '4'))
+VARIANT_WORKERS = int(os.environ.get('VARIANT_WORKERS', '8'))
+
+# Originals up to IN_MEMORY_MAX_BYTES are read into memory; larger ones are
+# streamed to /tmp and decoded lazily from there. Larger than
+# MAX_OBJECT_BYTES or MAX_IMAGE_PIXELS (decompression bombs) is refused
+IN_MEMORY_MAX_BYTES = int(os.environ.get('IN_MEMORY_MAX_BYTES', str(8 * 1024 * 1024)))
+MAX_OBJECT_BYTES = int(os.environ.get('MAX_OBJECT_BYTES', str(200 * 1024 * 1024)))
+Image.MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(64 * 1000 * 1000)))
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Concurrent records share /tmp, which is the function's ephemeral storage
+# (512 MB unless configured larger), so RECORD_CONCURRENCY originals of up
+# to MAX_OBJECT_BYTES may not fit at once. TMP_STAGING_BYTES caps the bytes
+# staged there at a time, by default 90% of /tmp: a record waits for room,
+# and an original larger than the cap is refused
+TMP_STAGING_BYTES = int(os.environ.get(
+    'TMP_STAGING_BYTES', str(int(shutil.disk_usage(tempfile.gettempdir()).total * 0.9))
+))
+
+# What to do with an image when Rekognition itself fails: "approve" it
+# (marked unverified in its metadata), "reject" it into quarantine, or
+# "fail" the invocation (lambda_handler raises) so Lambda retries it
+MODERATION_FAILURE_POLICIES = ('approve', 'reject', 'fail')
+MODERATION_FAILURE_POLICY = os.environ.get('MODERATION_FAILURE_POLICY', 'approve')
+if MODERATION_FAILURE_POLICY not in MODERATION_FAILURE_POLICIES:
+    raise ValueError(f"Unknown MODERATION_FAILURE_POLICY: {MODERATION_FAILURE_POLICY}")
+
+# AWS clients, shared by all threads (boto3 clients are thread-safe). The
+# connection pool covers every variant upload in flight at once
+s3_client = boto3.client('s3', config=Config(
+    max_pool_connections=int(os.environ.get('S3_MAX_POOL_CONNECTIONS', str(RECORD_CONCURRENCY * len(SIZES) + 2))),
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    tcp_keepalive=True
+))
 rekognition_client = boto3.client('rekognition')
 
+# Content-hash index of processed originals (see variant_cache.py)
+variant_index = index_from_env(s3_client)
+
+# Created once per container, so warm invocations reuse the threads.
+# Moderation calls get their own threads, so they never queue behind encodes
+variant_pool = ThreadPoolExecutor(max_workers=VARIANT_WORKERS, thread_name_prefix='variant')
+moderation_pool = ThreadPoolExecutor(max_workers=RECORD_CONCURRENCY, thread_name_prefix='moderation')
+
+class StagingBudget:
+    """Bytes of /tmp reserved by records streaming their originals there"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+    
+    def try_reserve(self, size):
+        with self._condition:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+    
+    def reserve(self, size):
+        with self._condition:
+            self._condition.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+    
+    def release(self, size):
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+staging_budget = StagingBudget(TMP_STAGING_BYTES)
+
+class ModerationUnavailable(Exception):
+    """Raised when Rekognition fails under the "fail" moderation policy"""
+
 def lambda_handler(event, context):
     """
     Image Processor Lambda Function
@@ -23,21 +109,31 @@ def lambda_handler(event, context):
     try:
         logger.info("Starting image processing")
         
-        # Parse S3 event
-        for record in event['Records']:
-            # Get bucket and key from S3 event
-            bucket = record['s3']['bucket']['name']
-            key = urllib.parse.unquote_plus(record['s3']['object']['key'], encoding='utf-8')
-            
-            logger.info(f"Processing image: s3://{bucket}/{key}")
-            
-            # Validate file type
-            if not is_image_file(key):
-                logger.warning(f"File {key} is not an image, skipping processing")
-                continue
-            
-            # Process the image
-            process_image(bucket, key)
+        # Parse S3 event; records are processed concurrently, and the first
+        # failure is raised once every record has finished
+        with ThreadPoolExecutor(max_workers=RECORD_CONCURRENCY, thread_name_prefix='record') as pool:
+            futures = [pool.submit(process_record, record) for record in event['Records']]
+        # An image left unmoderated under the "fail" policy is neither
+        # processed nor quarantined; only a failed invocation gets retried
+        for future in futures:
+            if isinstance(future.exception(), ModerationUnavailable):
+                raise future.exception()
+        results = [future.result() for future in futures]
+        
+        # Dedup cache effectiveness across this event's images. Time saved
+        # is how long the original uploads took to process (moderation
+        # included, since a hit makes no Rekognition call) minus what the
+        # hits took; with concurrent records that is more than the CPU time
+        # they used
+        processed = [result for result in results if result is not None]
+        cache_hits = sum(1 for result in processed if result['cache_hit'])
+        cache_stats = {
+            'hits': cache_hits,
+            'misses': len(processed) - cache_hits,
+            'hit_rate': cache_hits / len(processed) if processed else 0.0,
+            'processing_seconds_saved': round(sum(result['processing_seconds_saved'] for result in processed), 3)
+        }
+        logger.info(f"Variant cache: {json.dumps(cache_stats)}")
             
         logger.info("Image processing completed successfully")
         
@@ -50,10 +146,14 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'status': 'success',
                 'message': 'Images processed successfully',
-                'processed_count': len(event['Records'])
+                'processed_count': len(event['Records']),
+                'cache': cache_stats
             })
         }
         
+    except ModerationUnavailable as e:
+        logger.error(f"Image processing error, failing the invocation for a retry: {str(e)}")
+        raise
     except Exception as e:
         logger.error(f"Image processing error: {str(e)}")
         return {
@@ -68,6 +168,22 @@ def lambda_handler(event, context):
             })
         }
 
+def process_record(record):
+    """Process the image named by one S3 event record"""
+    # Get bucket and key from S3 event
+    bucket = record['s3']['bucket']['name']
+    key = urllib.parse.unquote_plus(record['s3']['object']['key'], encoding='utf-8')
+    
+    logger.info(f"Processing image: s3://{bucket}/{key}")
+    
+    # Validate file type
+    if not is_image_file(key):
+        logger.warning(f"File {key} is not an image, skipping processing")
+        return
+    
+    # Process the image
+    return process_image(bucket, key)
+
 def is_image_file(filename):
     """Check if file is an image based on extension"""
     image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
@@ -76,93 +192,201 @@ def is_image_file(filename):
 
 def process_image(bucket, key):
     """
-    Process individual image: resize, optimize, and moderate
+    Process individual image: resize, optimize, and moderate.
+    Returns {'cache_hit': bool, 'processing_seconds_saved': float}
     """
+    moderation = None
+    variants = {}
+    start = time.perf_counter()
+    rss_before = peak_rss_mb()
     try:
         # Download image from S3
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        image_data = response['Body'].read()
-        
-        # Open image with PIL
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Get original dimensions
-        original_width, original_height = image.size
-        logger.info(f"Original image size: {original_width}x{original_height}")
+        with download_image(bucket, key) as (source, object_size, digest):
+            # Content processed before (e.g. a repost) is copied, not
+            # recomputed, and its moderation verdict reused without a
+            # Rekognition call
+            cached = variant_index.get(digest, bucket) if variant_index else None
+            if cached is not None and reuse_cached_variants(bucket, key, cached):
+                logger.info(f"Reused variants of {cached['key']} for {key} (sha256 {digest[:12]})")
+                saved = cached.get('processing_seconds', 0.0) - (time.perf_counter() - start)
+                return {'cache_hit': True, 'processing_seconds_saved': max(saved, 0.0)}
+            
+            # Rekognition reads the object from S3 itself, so moderation runs
+            # while the image is decoded and resized
+            moderation = moderation_pool.submit(moderate_image, bucket, key)
+            
+            # Open image with PIL: only the header is read here, and JPEGs
+            # decode only at the resolution needed
+            image, (original_width, original_height) = open_image(source, SIZES)
+            logger.info(f"Original image size: {original_width}x{original_height}")
+            
+            # Variants are encoded speculatively on the pool while the next
+            # size is resized from the previous, larger one; nothing is
+            # uploaded until moderation approves
+            for size_name, resized_image in resize_cascade(image, (original_width, original_height), SIZES):
+                variants[size_name] = variant_pool.submit(encode_jpeg, resized_image)
+            image.close()
         
         # Perform content moderation
-        moderation_result = moderate_image(bucket, key)
+        moderation_result = moderation.result()
+        if moderation_result.get('error') and MODERATION_FAILURE_POLICY == 'fail':
+            raise ModerationUnavailable(f"Moderation unavailable for {key}")
         
+        processed_images = {}
         if moderation_result.get('is_appropriate', True):
-            # Generate different sizes
-            sizes = {
-                'thumbnail': (150, 150),
-                'small': (400, 400),
-                'medium': (800, 800),
-                'large': (1200, 1200)
-            }
-            
-            processed_images = {}
-            
-            for size_name, dimensions in sizes.items():
-                processed_image = resize_image(image, dimensions)
+            uploads = {}
+            for size_name, future in variants.items():
+                variant_data = future.result()
                 processed_key = generate_processed_key(key, size_name)
                 
                 # Upload processed image to S3
-                upload_to_s3(processed_image, bucket, processed_key)
-                
+                upload = variant_pool.submit(upload_to_s3, variant_data, bucket, processed_key)
+                uploads[size_name] = (upload, processed_key, len(variant_data))
+            
+            for size_name, (upload, processed_key, size_bytes) in uploads.items():
+                upload.result()
                 processed_images[size_name] = {
                     'key': processed_key,
-                    'dimensions': dimensions,
-                    'size_kb': len(processed_image) / 1024
+                    'dimensions': SIZES[size_name],
+                    'size_kb': size_bytes / 1024
                 }
             
             # Update metadata
-            update_image_metadata(bucket, key, {
-                'processed': True,
-                'original_dimensions': f"{original_width}x{original_height}",
-                'processed_versions': list(sizes.keys()),
-                'moderation_status': 'approved',
-                'moderation_confidence': moderation_result.get('confidence', 1.0)
-            })
+            update_image_metadata(bucket, key, approved_metadata(
+                f"{original_width}x{original_height}", moderation_result
+            ))
             
             logger.info(f"Image processed successfully: {len(processed_images)} versions created")
             
         else:
-            # Image failed moderation
+            # Image failed moderation; the encoded variants are dropped
             handle_inappropriate_image(bucket, key, moderation_result)
+        
+        processing_seconds = time.perf_counter() - start
+        # A verdict from a failed moderation call is not reused. The image is
+        # already processed, so failing to index it only costs a later repost
+        if variant_index and not moderation_result.get('error'):
+            try:
+                variant_index.put(digest, {
+                    'bucket': bucket,
+                    'key': key,
+                    'original_dimensions': f"{original_width}x{original_height}",
+                    'variants': {size_name: image_info['key'] for size_name, image_info in processed_images.items()},
+                    'moderation': moderation_result,
+                    'processing_seconds': processing_seconds
+                }, bucket)
+            except Exception as e:
+                logger.warning(f"Could not index {key} (sha256 {digest[:12]}): {str(e)}")
+        
+        # Peak RSS is the process's high-water mark: the growth includes
+        # concurrent records, and is zero for an image smaller than one
+        # processed earlier in the same container
+        peak_rss = peak_rss_mb()
+        logger.info(
+            f"Processed {key}: {object_size / 1024 / 1024:.1f} MB, "
+            f"{original_width * original_height / 1e6:.1f} MP in {processing_seconds:.2f}s; "
+            f"peak RSS {peak_rss:.0f} MB (+{peak_rss - rss_before:.0f} MB)"
+        )
+        return {'cache_hit': False, 'processing_seconds_saved': 0.0}
             
     except Exception as e:
         logger.error(f"Failed to process image {key}: {str(e)}")
         raise
+    finally:
+        # Unused speculative work is dropped, and a moderation call still
+        # running after a failure is not waited for
+        for future in variants.values():
+            future.cancel()
+        if moderation is not None:
+            moderation.cancel()
+
+def approved_metadata(original_dimensions, moderation_result):
+    # S3 user metadata maps strings to strings; botocore rejects anything else
+    return {
+        'processed': 'true',
+        'original_dimensions': original_dimensions,
+        'processed_versions': ','.join(SIZES.keys()),
+        'moderation_status': 'unverified' if moderation_result.get('error') else 'approved',
+        'moderation_confidence': str(moderation_result.get('confidence', 1.0))
+    }
 
-def resize_image(image, dimensions):
-    """Resize image to specified dimensions while maintaining aspect ratio"""
+def reuse_cached_variants(bucket, key, cached):
+    """
+    Apply a cached result to a new upload of the same content: quarantine it
+    again, or copy the variants server-side. False if the cached variants
+    are gone, so the image is processed from scratch
+    """
+    moderation_result = cached['moderation']
+    if not moderation_result.get('is_appropriate', True):
+        handle_inappropriate_image(bucket, key, moderation_result)
+        return True
+    
+    copies = []
+    for size_name, source_key in cached['variants'].items():
+        processed_key = generate_processed_key(key, size_name)
+        # The same content uploaded again under the same key
+        if (cached['bucket'], source_key) != (bucket, processed_key):
+            copies.append(variant_pool.submit(
+                s3_client.copy_object,
+                Bucket=bucket,
+                Key=processed_key,
+                CopySource={'Bucket': cached['bucket'], 'Key': source_key}
+            ))
     try:
-        # Calculate new dimensions maintaining aspect ratio
-        original_width, original_height = image.size
-        target_width, target_height = dimensions
-        
-        # Calculate scaling factor
-        width_ratio = target_width / original_width
-        height_ratio = target_height / original_height
-        scaling_factor = min(width_ratio, height_ratio)
-        
-        new_width = int(original_width * scaling_factor)
-        new_height = int(original_height * scaling_factor)
-        
-        # Resize image
-        resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Convert to bytes
-        output_buffer = io.BytesIO()
-        resized_image.save(output_buffer, format='JPEG', quality=85, optimize=True)
-        
-        return output_buffer.getvalue()
-        
+        for copy in copies:
+            copy.result()
     except Exception as e:
-        logger.error(f"Image resize failed: {str(e)}")
-        raise
+        logger.warning(f"Could not copy cached variants of {cached['key']}: {str(e)}")
+        return False
+    
+    update_image_metadata(bucket, key, approved_metadata(cached['original_dimensions'], moderation_result))
+    return True
+
+@contextmanager
+def download_image(bucket, key):
+    """
+    Yield (file object, size, sha256 hex digest) for an original. The GET
+    response's headers give the size before any of the body is read, so
+    oversized objects are refused without downloading them and large ones
+    are streamed to /tmp (within staging_budget), hashed on the way
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    object_size = response['ContentLength']
+    body = response['Body']
+    reserved = 0
+    try:
+        if object_size > MAX_OBJECT_BYTES:
+            raise ValueError(f"Image {key} is {object_size} bytes, over the {MAX_OBJECT_BYTES} byte limit")
+        if object_size <= IN_MEMORY_MAX_BYTES:
+            image_data = body.read()
+            yield io.BytesIO(image_data), object_size, hashlib.sha256(image_data).hexdigest()
+            return
+        if object_size > staging_budget.limit:
+            raise ValueError(f"Image {key} is {object_size} bytes, over the {staging_budget.limit} byte /tmp limit")
+        if not staging_budget.try_reserve(object_size):
+            # Wait for other records to free /tmp without holding the
+            # response open, then fetch the same version again
+            body.close()
+            staging_budget.reserve(object_size)
+            reserved = object_size
+            conditions = {'IfMatch': response['ETag']} if response.get('ETag') else {}
+            body = s3_client.get_object(Bucket=bucket, Key=key, **conditions)['Body']
+        reserved = object_size
+        digest = hashlib.sha256()
+        with tempfile.TemporaryFile(prefix='original-') as f:
+            for chunk in iter(lambda: body.read(DOWNLOAD_CHUNK_BYTES), b''):
+                digest.update(chunk)
+                f.write(chunk)
+            f.seek(0)
+            yield f, object_size, digest.hexdigest()
+    finally:
+        body.close()
+        if reserved:
+            staging_budget.release(reserved)
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 def moderate_image(bucket, key):
     """
@@ -192,9 +416,14 @@ def moderate_image(bucket, key):
             }
             
     except Exception as e:
-        logger.warning(f"Rekognition moderation failed: {str(e)}")
-        # Fallback: assume image is appropriate if moderation fails
-        return {'is_appropriate': True, 'confidence': 50.0}
+        logger.warning(f"Rekognition moderation failed: {str(e)} (policy: {MODERATION_FAILURE_POLICY})")
+        # Only the "reject" policy quarantines; "fail" is raised by the caller
+        return {
+            'is_appropriate': MODERATION_FAILURE_POLICY != 'reject',
+            'moderation_labels': [],
+            'confidence': 50.0,
+            'error': str(e)
+        }
 
 def generate_processed_key(original_key, size_name):
     """Generate S3 key for processed image"""
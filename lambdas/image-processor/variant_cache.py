@@ -0,0 +1,122 @@
+"""
+Content-addressed index of processed images.
+
+Reposts upload the same bytes under a new key. The sha256 of the original
+is looked up here before the image is decoded. A hit names where the
+variants for that content already are and what moderation decided, so the
+Lambda copies the variants server-side instead of recomputing them.
+
+S3VariantIndex keeps one small JSON object per digest in a bucket;
+SQLiteVariantIndex keeps the same entries in a SQLite file for local runs
+and tests. VARIANT_INDEX selects one: "s3" (the default), "s3://bucket/prefix",
+"sqlite:<path>" or "off".
+
+The index is only an optimization: S3VariantIndex treats any error reading
+or writing an entry as a miss, so an image is then processed as if new.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS variant_index (
+    digest TEXT PRIMARY KEY,
+    entry TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+DEFAULT_PREFIX = 'variant-index/'
+
+logger = logging.getLogger(__name__)
+
+
+class VariantIndex:
+    """Interface: digest -> entry dict. bucket is the original's bucket"""
+
+    def get(self, digest, bucket=None):
+        raise NotImplementedError
+
+    def put(self, digest, entry, bucket=None):
+        raise NotImplementedError
+
+
+class S3VariantIndex(VariantIndex):
+    """One JSON object per digest, e.g. s3://bucket/variant-index/<sha256>.json"""
+
+    def __init__(self, s3_client, bucket=None, prefix=DEFAULT_PREFIX):
+        self.s3_client = s3_client
+        # None: the bucket the original was uploaded to
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, digest, bucket=None):
+        key = f"{self.prefix}{digest}.json"
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket or bucket, Key=key)
+            return json.loads(response['Body'].read())
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        except Exception as e:
+            # ClientError (e.g. AccessDenied, throttling), network errors, a
+            # corrupt entry
+            logger.warning(f"Variant index lookup of {key} failed, treating it as a miss: {str(e)}")
+            return None
+
+    def put(self, digest, entry, bucket=None):
+        key = f"{self.prefix}{digest}.json"
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket or bucket,
+                Key=key,
+                Body=json.dumps(entry).encode(),
+                ContentType='application/json'
+            )
+        except Exception as e:
+            logger.warning(f"Could not write variant index entry {key}: {str(e)}")
+
+
+class SQLiteVariantIndex(VariantIndex):
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, digest, bucket=None):
+        with self._lock:
+            row = self._conn.execute("SELECT entry FROM variant_index WHERE digest = ?", (digest,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, digest, entry, bucket=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO variant_index (digest, entry, created_at) VALUES (?, ?, ?)",
+                (digest, json.dumps(entry), time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def index_from_env(s3_client, spec=None):
+    """The index named by VARIANT_INDEX; None when the index is off"""
+    spec = spec if spec is not None else os.environ.get('VARIANT_INDEX', 's3')
+    if spec == 'off':
+        return None
+    if spec == 's3':
+        return S3VariantIndex(s3_client)
+    if spec.startswith('s3://'):
+        bucket, _, prefix = spec[len('s3://'):].partition('/')
+        return S3VariantIndex(s3_client, bucket, prefix or DEFAULT_PREFIX)
+    if spec.startswith('sqlite:'):
+        return SQLiteVariantIndex(spec[len('sqlite:'):])
+    raise ValueError(f"Unknown VARIANT_INDEX: {spec}")
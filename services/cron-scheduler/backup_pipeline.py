@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Streaming, deduplicating backup pipeline.
+
+A source (SQLite dump, pg_dump output or a directory as tar) is written
+into a chunker that cuts the stream at content-defined boundaries: a chunk
+ends after a line whose crc32 hits a bit mask, once the chunk has its
+minimum size. Inserting rows therefore only changes the chunks around the
+change, not every chunk after it. Each chunk is identified by its sha256,
+and a chunk already in storage is not stored again, so a daily backup only
+adds what changed. Chunks are hashed, compressed and stored on a thread
+pool with a bounded number in flight, so the dump is never held in memory.
+
+A backup is described by a JSON manifest: the ordered chunk list plus the
+size and sha256 of the whole stream. Restoring streams the chunks back and
+verifies every chunk checksum and the whole-stream checksum.
+
+Storage is pluggable (BackupStorage); LocalStorage keeps everything under a
+directory, which is also what the tests use.
+
+    python backup_pipeline.py list /var/backups/multi-everything
+    python backup_pipeline.py restore /var/backups/multi-everything <manifest> out.sql
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tarfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Deque, List, Optional
+
+from compression import DEFAULT_LEVELS, EXTENSIONS, compress_bytes, decompress_bytes, resolve_codec
+
+logger = logging.getLogger('backup-pipeline')
+
+MANIFEST_FORMAT = 1
+
+# Chunk sizes: boundaries are only taken between MIN and MAX; a line hash
+# matching BOUNDARY_MASK ends a chunk (about one line in 4096)
+MIN_CHUNK_SIZE = 512 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+BOUNDARY_MASK = 0xFFF
+
+
+class BackupIntegrityError(Exception):
+    """Raised when restored data does not match the manifest's checksums"""
+
+
+class BackupStorage:
+    """Interface for backup targets: a flat key/value store of bytes"""
+
+    def put(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class LocalStorage(BackupStorage):
+    """Keys are paths under a root directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a half-written object never exists under its key
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        base = self._path(prefix)
+        for directory, _, files in os.walk(base):
+            for filename in files:
+                if filename.endswith(".partial"):
+                    continue
+                relative = os.path.relpath(os.path.join(directory, filename), self.root)
+                keys.append(relative.replace(os.sep, "/"))
+        return sorted(keys)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class ChunkingWriter(io.RawIOBase):
+    """Writable stream that cuts its input into content-defined chunks"""
+
+    def __init__(self, on_chunk: Callable[[bytes], None]):
+        self.on_chunk = on_chunk
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.size += len(data)
+        self.sha256.update(data)
+        start = 0
+        while True:
+            newline = data.find(b"\n", start)
+            if newline == -1:
+                self._buffer += data[start:]
+                while len(self._buffer) >= MAX_CHUNK_SIZE:
+                    self._emit(MAX_CHUNK_SIZE)
+                break
+            line = data[start:newline + 1]
+            self._buffer += line
+            start = newline + 1
+            if len(self._buffer) >= MAX_CHUNK_SIZE or (
+                len(self._buffer) >= MIN_CHUNK_SIZE and zlib.crc32(line) & BOUNDARY_MASK == 0
+            ):
+                self._emit(len(self._buffer))
+        return len(data)
+
+    def finish(self):
+        if self._buffer:
+            self._emit(len(self._buffer))
+
+    def _emit(self, length: int):
+        chunk = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        self.on_chunk(chunk)
+
+
+def _chunk_key(digest: str, codec: str) -> str:
+    return f"chunks/{digest[:2]}/{digest}{EXTENSIONS[codec]}"
+
+
+class BackupWriter:
+    """Hashes, deduplicates, compresses and stores chunks on a thread pool"""
+
+    def __init__(self, storage: BackupStorage, codec: str, level: int, workers: int):
+        self.storage = storage
+        self.codec = codec
+        self.level = level
+        self.workers = workers
+        self.chunks: List[dict] = []
+        self.new_chunks = 0
+        self.stored_bytes = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup")
+        self._pending: Deque = deque()
+
+    def add(self, chunk: bytes):
+        self._pending.append(self._pool.submit(self._store, chunk))
+        # Bounded read-ahead: at most two chunks per worker in memory
+        while len(self._pending) >= self.workers * 2 or (self._pending and self._pending[0].done()):
+            self._collect()
+
+    def finish(self):
+        while self._pending:
+            self._collect()
+        self._pool.shutdown(wait=True)
+
+    def abort(self):
+        for future in self._pending:
+            future.cancel()
+        self._pool.shutdown(wait=True)
+
+    def _collect(self):
+        entry, stored = self._pending.popleft().result()
+        self.chunks.append(entry)
+        if stored:
+            self.new_chunks += 1
+            self.stored_bytes += stored
+
+    def _store(self, chunk: bytes):
+        digest = hashlib.sha256(chunk).hexdigest()
+        key = _chunk_key(digest, self.codec)
+        stored = 0
+        if not self.storage.exists(key):
+            data = compress_bytes(chunk, self.codec, self.level)
+            self.storage.put(key, data)
+            stored = len(data)
+        return {"sha256": digest, "size": len(chunk), "key": key}, stored
+
+
+# Sources write the backup stream into a file-like sink
+
+def sqlite_source(path: str) -> Callable[[io.RawIOBase], None]:
+    def dump(sink):
+        # iterdump runs in one read transaction, so the dump is a consistent
+        # snapshot even while the database is being written
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            for statement in conn.iterdump():
+                sink.write(statement.encode() + b"\n")
+        finally:
+            conn.close()
+    return dump
+
+
+def pg_dump_source(dsn: str) -> Callable[[io.RawIOBase], None]:
+    def dump(sink):
+        # Plain SQL output is line-oriented, which is what the chunker dedups best
+        process = subprocess.Popen(["pg_dump", "--no-owner", "--dbname", dsn], stdout=subprocess.PIPE)
+        try:
+            shutil.copyfileobj(process.stdout, sink, 1024 * 1024)
+        finally:
+            process.stdout.close()
+            exit_code = process.wait()
+        if exit_code != 0:
+            raise RuntimeError(f"pg_dump exited with status {exit_code}")
+    return dump
+
+
+def directory_source(path: str) -> Callable[[io.RawIOBase], None]:
+    def dump(sink):
+        # Sorted walk, so unchanged trees produce identical tar streams
+        with tarfile.open(fileobj=sink, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for directory, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(dirnames) + sorted(filenames):
+                    full_path = os.path.join(directory, name)
+                    tar.add(full_path, arcname=os.path.relpath(full_path, path), recursive=False)
+    return dump
+
+
+def parse_source(spec: str) -> Callable[[io.RawIOBase], None]:
+    """"sqlite:<path>", "pg_dump:<dsn>" or "dir:<path>\""""
+    kind, _, target = spec.partition(":")
+    sources = {"sqlite": sqlite_source, "pg_dump": pg_dump_source, "dir": directory_source}
+    if kind not in sources or not target:
+        raise ValueError(f"Unknown backup source: {spec}")
+    return sources[kind](target)
+
+
+def backup(
+    source: Callable[[io.RawIOBase], None],
+    storage: BackupStorage,
+    name: str,
+    codec: str = "gzip",
+    level: Optional[int] = None,
+    workers: int = 4,
+    description: str = ""
+) -> dict:
+    """Stream a source into storage; returns the manifest (also stored)"""
+    codec = resolve_codec(codec)
+    start = time.perf_counter()
+    writer = BackupWriter(storage, codec, level if level is not None else DEFAULT_LEVELS[codec], workers)
+    chunker = ChunkingWriter(writer.add)
+    try:
+        source(chunker)
+        chunker.finish()
+        writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+    created_at = datetime.utcnow()
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "name": name,
+        "source": description,
+        "created_at": created_at.isoformat() + "Z",
+        "codec": codec,
+        "size": chunker.size,
+        "sha256": chunker.sha256.hexdigest(),
+        "chunks": writer.chunks,
+        "stats": {
+            "chunks": len(writer.chunks),
+            "new_chunks": writer.new_chunks,
+            "stored_bytes": writer.stored_bytes,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+    }
+    key = f"manifests/{name}/{created_at.strftime('%Y%m%dT%H%M%S%fZ')}.json"
+    storage.put(key, json.dumps(manifest, indent=1).encode())
+    manifest["key"] = key
+    return manifest
+
+
+def list_manifests(storage: BackupStorage, name: Optional[str] = None) -> List[str]:
+    """Manifest keys, oldest first"""
+    return storage.list(f"manifests/{name}" if name else "manifests")
+
+
+def load_manifest(storage: BackupStorage, key: str) -> dict:
+    return json.loads(storage.get(key))
+
+
+class BackupReader(io.RawIOBase):
+    """Readable stream of a backup; every chunk and the whole stream are verified"""
+
+    def __init__(self, storage: BackupStorage, manifest: dict, prefetch: int = 4):
+        self.storage = storage
+        self.manifest = manifest
+        self.codec = manifest["codec"]
+        self._chunks = iter(manifest["chunks"])
+        self._pool = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="restore")
+        self._pending: Deque = deque()
+        self._prefetch = prefetch
+        self._current = memoryview(b"")
+        self._sha256 = hashlib.sha256()
+        self._size = 0
+        self._fill()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            if not self._pending:
+                self._verify_stream()
+                return 0
+            data = self._pending.popleft().result()
+            self._sha256.update(data)
+            self._size += len(data)
+            self._current = memoryview(data)
+            self._fill()
+        n = min(len(buffer), len(self._current))
+        buffer[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+    def _fill(self):
+        while len(self._pending) < self._prefetch:
+            entry = next(self._chunks, None)
+            if entry is None:
+                return
+            self._pending.append(self._pool.submit(self._fetch, entry))
+
+    def _fetch(self, entry: dict) -> bytes:
+        data = decompress_bytes(self.storage.get(entry["key"]), self.codec)
+        if len(data) != entry["size"] or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            raise BackupIntegrityError(f"Chunk {entry['key']} does not match its checksum")
+        return data
+
+    def _verify_stream(self):
+        if self._size != self.manifest["size"] or self._sha256.hexdigest() != self.manifest["sha256"]:
+            raise BackupIntegrityError("Restored stream does not match the manifest checksum")
+
+
+def restore(storage: BackupStorage, manifest_key: str, out) -> int:
+    """Write the verified backup stream to a binary file object; returns its size"""
+    with BackupReader(storage, load_manifest(storage, manifest_key)) as reader:
+        shutil.copyfileobj(reader, out, 1024 * 1024)
+        return reader.manifest["size"]
+
+
+def restore_directory(storage: BackupStorage, manifest_key: str, target: str):
+    """Extract a dir: backup into target"""
+    with BackupReader(storage, load_manifest(storage, manifest_key)) as reader:
+        with tarfile.open(fileobj=reader, mode="r|") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(target, filter="data")
+            else:
+                tar.extractall(target)
+        # Reading to the end runs the whole-stream verification
+        while reader.read(1024 * 1024):
+            pass
+
+
+def prune(storage: BackupStorage, name: str, keep: int) -> int:
+    """
+    Keep the newest `keep` manifests of a backup, then delete chunks no
+    manifest references. Must not run while another backup is writing to
+    the same storage. Returns the number of chunks deleted.
+    """
+    manifests = list_manifests(storage, name)
+    for key in manifests[:-keep] if keep > 0 else []:
+        storage.delete(key)
+
+    referenced = set()
+    for key in list_manifests(storage):
+        referenced.update(entry["key"] for entry in load_manifest(storage, key)["chunks"])
+    deleted = 0
+    for key in storage.list("chunks"):
+        if key not in referenced:
+            storage.delete(key)
+            deleted += 1
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="list manifests in a local backup directory")
+    list_parser.add_argument("target")
+    list_parser.add_argument("--name")
+    restore_parser = subparsers.add_parser("restore", help="restore and verify a backup")
+    restore_parser.add_argument("target")
+    restore_parser.add_argument("manifest", help="manifest key, e.g. manifests/db/20261018T030000Z.json")
+    restore_parser.add_argument("output", help="output file, or a directory for dir: backups")
+    args = parser.parse_args()
+
+    storage = LocalStorage(args.target)
+    if args.command == "list":
+        for key in list_manifests(storage, args.name):
+            manifest = load_manifest(storage, key)
+            print(f"{key}\t{manifest['size']} bytes\t{manifest['source']}")
+        return
+    if load_manifest(storage, args.manifest)["source"].startswith("dir:"):
+        restore_directory(storage, args.manifest, args.output)
+    else:
+        with open(args.output, "wb") as out:
+            restore(storage, args.manifest, out)
+    print(f"Restored {args.manifest} to {args.output}; checksums verified")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -2,12 +2,18 @@
 """
 Backup task for Multi-Everything DevOps Platform
 Runs daily at 3 AM via cron
+
+The dump is streamed through the chunked, deduplicated backup pipeline
+(backup_pipeline.py). BACKUP_SOURCE selects what is backed up:
+"sqlite:<path>", "pg_dump:<dsn>" or "dir:<path>". Backups are stored under
+BACKUP_TARGET_DIR; the newest BACKUP_KEEP are kept.
 """
 
 import os
 import logging
-from datetime import datetime
-import subprocess
+import sys
+
+from backup_pipeline import LocalStorage, backup, parse_source, prune
 
 # Setup logging
 logging.basicConfig(
@@ -16,30 +22,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger('backup-task')
 
+BACKUP_TARGET_DIR = os.environ.get("BACKUP_TARGET_DIR", "/var/backups/multi-everything")
+
 def run_backup():
     """Execute database backup"""
     try:
         logger.info("Starting database backup...")
-        
-        # Simulate backup process
-        # In production, this would:
-        # 1. Dump PostgreSQL database
-        # 2. Upload to S3
-        # 3. Cleanup old backups
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"/tmp/backup_{timestamp}.sql"
-        
-        # Simulate backup command
-        logger.info(f"Creating backup: {backup_file}")
-        
-        # Simulate successful backup
-        logger.info("Backup completed successfully")
+
+        source_spec = os.environ.get("BACKUP_SOURCE")
+        if not source_spec:
+            logger.error("Backup failed: BACKUP_SOURCE is not set")
+            return False
+
+        storage = LocalStorage(BACKUP_TARGET_DIR)
+        manifest = backup(
+            parse_source(source_spec),
+            storage,
+            name=os.environ.get("BACKUP_NAME", "database"),
+            codec=os.environ.get("BACKUP_CODEC", "gzip"),
+            workers=int(os.environ.get("BACKUP_WORKERS", "4")),
+            description=source_spec
+        )
+
+        stats = manifest["stats"]
+        seconds = stats["seconds"]
+        logger.info(
+            f"Backup {manifest['key']} completed: {manifest['size'] / 1024 / 1024:.1f} MB in {seconds:.1f}s "
+            f"({manifest['size'] / 1024 / 1024 / seconds if seconds else 0:.1f} MB/s); "
+            f"{stats['new_chunks']} of {stats['chunks']} chunks new, "
+            f"{stats['stored_bytes'] / 1024 / 1024:.1f} MB stored"
+        )
+
+        deleted = prune(storage, manifest["name"], int(os.environ.get("BACKUP_KEEP", "14")))
+        if deleted:
+            logger.info(f"Removed {deleted} chunks no longer referenced by any backup")
         return True
-        
+
     except Exception as e:
         logger.error(f"Backup failed: {e}")
         return False
 
 if __name__ == "__main__":
-    run_backup()
\ No newline at end of file
+    # Non-zero exit status, so the scheduler records the run as failed
+    sys.exit(0 if run_backup() else 1)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Rule-driven file cleanup shared by cleanup_task and log_rotation.
+
+Directories are walked with os.scandir, whose entries already know whether
+they are files (no stat) and cache their stat result, so each candidate is
+stat'ed at most once and names that do not match a rule's patterns are
+never stat'ed at all. Deletions run in parallel batches on a thread pool.
+
+A rule selects files under a root by name pattern, minimum age and minimum
+size, optionally keeping the newest N matches. In dry-run mode nothing is
+deleted; the report lists what would have been.
+"""
+
+import fnmatch
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('cleanup-engine')
+
+DELETE_BATCH_SIZE = 500
+
+
+@dataclass
+class CleanupRule:
+    name: str
+    root: str
+    patterns: Sequence[str] = ("*",)
+    min_age_days: float = 0.0
+    min_size_bytes: int = 0
+    # The rule's newest N matching files are kept regardless of age
+    keep_newest: int = 0
+    recursive: bool = False
+    # "mtime" or "ctime"
+    age_field: str = "mtime"
+
+    def __post_init__(self):
+        if self.age_field not in ("mtime", "ctime"):
+            raise ValueError(f"Unknown age field for rule {self.name}: {self.age_field}")
+        if isinstance(self.patterns, str):
+            self.patterns = (self.patterns,)
+
+
+@dataclass
+class CleanupReport:
+    rule: str
+    dry_run: bool
+    scanned: int = 0
+    matched: int = 0
+    deleted: int = 0
+    bytes_freed: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    # Dry runs only: paths that would be deleted
+    paths: List[str] = field(default_factory=list)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.scanned / self.seconds if self.seconds else 0.0
+
+
+def load_rules(path: str) -> List[CleanupRule]:
+    """Read rules from a JSON list of CleanupRule fields"""
+    with open(path) as f:
+        return [CleanupRule(**rule) for rule in json.load(f)]
+
+
+def _matches(name: str, patterns: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def scan(rule: CleanupRule, report: CleanupReport) -> List[Tuple[float, int, str]]:
+    """(timestamp, size, path) of every file matching the rule's patterns"""
+    matches = []
+    directories = [rule.root]
+    while directories:
+        directory = directories.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            report.errors += 1
+            logger.warning(f"Could not scan {directory}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                report.scanned += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rule.recursive:
+                            directories.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False) or not _matches(entry.name, rule.patterns):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    # Removed by someone else while scanning
+                    continue
+                timestamp = st.st_mtime if rule.age_field == "mtime" else st.st_ctime
+                matches.append((timestamp, st.st_size, entry.path))
+    return matches
+
+
+def _delete_batch(paths: List[Tuple[str, int]]) -> Tuple[int, int, int]:
+    deleted = freed = errors = 0
+    for path, size in paths:
+        try:
+            os.remove(path)
+            deleted += 1
+            freed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors += 1
+            logger.warning(f"Could not delete {path}: {e}")
+    return deleted, freed, errors
+
+
+def run_rule(
+    rule: CleanupRule,
+    dry_run: bool = False,
+    pool: Optional[ThreadPoolExecutor] = None,
+    now: Optional[float] = None
+) -> CleanupReport:
+    report = CleanupReport(rule.name, dry_run)
+    start = time.perf_counter()
+    now = now if now is not None else time.time()
+
+    matches = scan(rule, report)
+    report.matched = len(matches)
+    if rule.keep_newest:
+        matches.sort(reverse=True)
+        matches = matches[rule.keep_newest:]
+    cutoff = now - rule.min_age_days * 86400
+    doomed = [
+        (path, size) for timestamp, size, path in matches
+        if timestamp < cutoff and size >= rule.min_size_bytes
+    ]
+    if dry_run:
+        report.paths = [path for path, _ in doomed]
+        report.deleted = len(doomed)
+        report.bytes_freed = sum(size for _, size in doomed)
+    else:
+        batches = [doomed[i:i + DELETE_BATCH_SIZE] for i in range(0, len(doomed), DELETE_BATCH_SIZE)]
+        results = pool.map(_delete_batch, batches) if pool else map(_delete_batch, batches)
+        for deleted, freed, errors in results:
+            report.deleted += deleted
+            report.bytes_freed += freed
+            report.errors += errors
+
+    report.seconds = time.perf_counter() - start
+    logger.info(
+        f"Rule {rule.name}: scanned {report.scanned} entries in {report.seconds:.2f}s "
+        f"({report.files_per_second:.0f}/s), matched {report.matched}, "
+        f"{'would delete' if dry_run else 'deleted'} {report.deleted} "
+        f"({report.bytes_freed / 1024 / 1024:.1f} MB), {report.errors} errors"
+    )
+    return report
+
+
+def run_rules(rules: Sequence[CleanupRule], dry_run: bool = False, workers: int = 4) -> List[CleanupReport]:
+    """Apply each rule in turn, deleting with one shared pool"""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cleanup") as pool:
+        return [run_rule(rule, dry_run=dry_run, pool=pool) for rule in rules]
+
+
+def dry_run_from_env() -> bool:
+    return os.environ.get("CLEANUP_DRY_RUN", "").lower() in ("1", "true", "yes")
@@ -2,12 +2,18 @@
 """
 Cleanup task for Multi-Everything DevOps Platform
 Runs every Sunday at 4 AM via cron
+
+Rules run on the shared cleanup engine (cleanup_engine.py). Set
+CLEANUP_RULES_FILE to a JSON list of rules to replace the defaults,
+CLEANUP_DRY_RUN=1 to only report what would be deleted, and
+CLEANUP_WORKERS for the number of parallel deleters.
 """
 
 import os
 import logging
-import glob
-from datetime import datetime, timedelta
+import sys
+
+from cleanup_engine import CleanupRule, dry_run_from_env, load_rules, run_rules
 
 # Setup logging
 logging.basicConfig(
@@ -16,38 +22,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger('cleanup-task')
 
+# Define cleanup rules: temporary files older than 7 days
+DEFAULT_RULES = [
+    CleanupRule("tmp", "/tmp", patterns=("*.tmp", "*.log"), min_age_days=7, age_field="ctime"),
+    CleanupRule("var-tmp", "/var/tmp", patterns=("*.tmp",), min_age_days=7, age_field="ctime")
+]
+
 def cleanup_old_files():
     """Clean up temporary and old files"""
     try:
         logger.info("Starting cleanup task...")
         
-        # Define cleanup patterns
-        cleanup_patterns = [
-            "/tmp/*.tmp",
-            "/tmp/*.log",
-            "/var/tmp/*.tmp"
-        ]
-        
-        deleted_files = 0
+        rules_file = os.environ.get("CLEANUP_RULES_FILE")
+        rules = load_rules(rules_file) if rules_file else DEFAULT_RULES
+        dry_run = dry_run_from_env()
         
-        for pattern in cleanup_patterns:
-            for filepath in glob.glob(pattern):
-                try:
-                    # Check if file is older than 7 days
-                    file_time = datetime.fromtimestamp(os.path.getctime(filepath))
-                    if datetime.now() - file_time > timedelta(days=7):
-                        os.remove(filepath)
-                        deleted_files += 1
-                        logger.info(f"Deleted: {filepath}")
-                except Exception as e:
-                    logger.warning(f"Could not delete {filepath}: {e}")
+        reports = run_rules(rules, dry_run=dry_run, workers=int(os.environ.get("CLEANUP_WORKERS", "4")))
         
-        logger.info(f"Cleanup completed. Deleted {deleted_files} files.")
-        return True
+        deleted_files = sum(report.deleted for report in reports)
+        scanned = sum(report.scanned for report in reports)
+        seconds = sum(report.seconds for report in reports)
+        if dry_run:
+            for report in reports:
+                for path in report.paths:
+                    logger.info(f"Would delete: {path}")
+        logger.info(
+            f"Cleanup completed. {'Would delete' if dry_run else 'Deleted'} {deleted_files} files; "
+            f"scanned {scanned} entries ({scanned / seconds if seconds else 0:.0f}/s)."
+        )
+        return sum(report.errors for report in reports) == 0
         
     except Exception as e:
         logger.error(f"Cleanup task failed: {e}")
         return False
 
 if __name__ == "__main__":
-    cleanup_old_files()
\ No newline at end of file
+    # Non-zero exit status, so the scheduler records the run as failed
+    sys.exit(0 if cleanup_old_files() else 1)
\ No newline at end of file
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Parallel file compression for the scheduler's tasks.
+
+gzip is compressed pigz-style: the input is cut into fixed-size blocks,
+each block is compressed into an independent gzip member on a thread pool
+(zlib releases the GIL), and the members are written in order. Concatenated
+members are a valid gzip file that gunzip and Python's gzip module read as
+one stream. At most a few blocks per worker are in flight, so memory stays
+bounded however large the input is.
+
+zstd uses the zstandard package's own multi-threaded compressor when it is
+installed; without it, zstd falls back to gzip.
+"""
+
+import gzip
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger('compression')
+
+CODECS = ("gzip", "zstd")
+EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+@dataclass
+class CompressionResult:
+    source: str
+    destination: str
+    codec: str
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+
+    @property
+    def ratio(self) -> float:
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_in / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+
+def resolve_codec(codec: str) -> str:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+    if codec == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed; compressing with gzip instead")
+        return "gzip"
+    return codec
+
+
+def compress_bytes(data: bytes, codec: str = "gzip", level: Optional[int] = None) -> bytes:
+    """Compress one block in memory (e.g. a backup chunk)"""
+    level = level if level is not None else DEFAULT_LEVELS[codec]
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, level, mtime=0)
+
+
+def decompress_bytes(data: bytes, codec: str = "gzip") -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd data")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ParallelCompressor:
+    """Compresses files with one shared worker pool, so concurrent files share the CPUs"""
+
+    def __init__(
+        self,
+        codec: str = "gzip",
+        level: Optional[int] = None,
+        workers: Optional[int] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ):
+        self.codec = resolve_codec(codec)
+        self.level = level if level is not None else DEFAULT_LEVELS[self.codec]
+        self.workers = workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self.extension = EXTENSIONS[self.codec]
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="compress")
+
+    def compress_stream(self, f_in: BinaryIO, f_out: BinaryIO) -> int:
+        """Compress f_in into f_out; returns the number of input bytes"""
+        if self.codec == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.level, threads=self.workers)
+            bytes_in, _ = compressor.copy_stream(f_in, f_out, read_size=self.block_size)
+            return bytes_in
+
+        bytes_in = 0
+        pending = deque()
+        max_pending = self.workers * 2
+        while True:
+            block = f_in.read(self.block_size)
+            if not block:
+                break
+            bytes_in += len(block)
+            pending.append(self._pool.submit(gzip.compress, block, self.level, mtime=0))
+            # Write finished members in order, keeping the read-ahead bounded
+            while len(pending) >= max_pending or (pending and pending[0].done()):
+                f_out.write(pending.popleft().result())
+        while pending:
+            f_out.write(pending.popleft().result())
+        return bytes_in
+
+    def compress_file(self, source: str, destination: Optional[str] = None) -> CompressionResult:
+        """Compress source into destination (default: source plus the codec extension)"""
+        destination = destination or source + self.extension
+        # Written under a temporary name, so a killed run never leaves a
+        # truncated archive behind
+        partial = destination + ".partial"
+        start = time.perf_counter()
+        try:
+            with open(source, "rb") as f_in, open(partial, "wb") as f_out:
+                bytes_in = self.compress_stream(f_in, f_out)
+            os.replace(partial, destination)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return CompressionResult(
+            source=source,
+            destination=destination,
+            codec=self.codec,
+            bytes_in=bytes_in,
+            bytes_out=os.path.getsize(destination),
+            seconds=time.perf_counter() - start
+        )
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
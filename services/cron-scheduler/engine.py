@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Scheduler engine for the cron scheduler.
+
+Jobs sit in a min-heap keyed by their next run time. The loop sleeps until
+the earliest deadline and is woken early when a job is added or removed, so
+an idle scheduler costs nothing and a job fires on time instead of up to a
+second late. Picking the next job is O(log n), so thousands of jobs are
+fine.
+
+Triggers are either cron expressions ("0 3 * * *", local time) or fixed
+intervals. A crontab file can be loaded into the same engine, so there is
+no separate cron daemon.
+
+With a state store, the last scheduled time of every job survives restarts.
+Runs that were due while the scheduler was down (or asleep) are handled by
+the job's misfire policy:
+
+- "run_once": run once to catch up, however many deadlines were missed
+- "run_all": run once per missed deadline (up to MAX_CATCH_UP)
+- "skip": drop missed runs and wait for the next deadline
+"""
+
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger('cron-engine')
+
+# Wake at least this often, so a wall clock change (NTP, DST) is noticed
+MAX_SLEEP = 60.0
+
+# A run fired later than this after its scheduled time counts as a missed deadline
+MISSED_DEADLINE_TOLERANCE = 1.0
+
+MISFIRE_POLICIES = ("run_once", "run_all", "skip")
+
+# Upper bound on runs replayed by the "run_all" policy
+MAX_CATCH_UP = 100
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+DAY_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+
+def _parse_field(field: str, low: int, high: int, names: Dict[str, int]) -> Set[int]:
+    values = set()
+    for part in field.lower().split(","):
+        expr, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in cron field '{field}'")
+        if expr == "*":
+            start, end = low, high
+        else:
+            first, _, last = expr.partition("-")
+            start = names[first] if first in names else int(first)
+            end = (names[last] if last in names else int(last)) if last else (high if step > 1 else start)
+        if not low <= start <= end <= high:
+            raise ValueError(f"Cron field '{field}' is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronTrigger:
+    """Standard five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs five fields: '{expression}'")
+        minute, hour, day, month, weekday = fields
+        self.minutes = sorted(_parse_field(minute, 0, 59, {}))
+        self.hours = sorted(_parse_field(hour, 0, 23, {}))
+        self.days = _parse_field(day, 1, 31, {})
+        self.months = _parse_field(month, 1, 12, MONTH_NAMES)
+        # 0 and 7 are both Sunday
+        self.weekdays = {d % 7 for d in _parse_field(weekday, 0, 7, DAY_NAMES)}
+        # Like cron: when both day fields are restricted, either may match
+        self._day_star = day == "*"
+        self._weekday_star = weekday == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._day_star:
+            return weekday_ok
+        if self._weekday_star:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        dt = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt.year + 5
+        # Skip whole months and days that cannot match, then jump straight to
+        # the next allowed hour and minute
+        while dt.year <= limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            i = bisect.bisect_left(self.hours, dt.hour)
+            if i == len(self.hours):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if self.hours[i] != dt.hour:
+                dt = dt.replace(hour=self.hours[i], minute=0)
+            j = bisect.bisect_left(self.minutes, dt.minute)
+            if j == len(self.minutes):
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            return dt.replace(minute=self.minutes[j]).timestamp()
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
+
+    def __repr__(self):
+        return f"cron({self.expression})"
+
+
+class IntervalTrigger:
+    """Fires every `seconds`, on multiples of the interval since the Unix epoch"""
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, timestamp: float) -> float:
+        # Aligned deadlines are the same on every replica and after restarts
+        return (timestamp // self.seconds + 1) * self.seconds
+
+    def __repr__(self):
+        return f"every({self.seconds}s)"
+
+
+class ScheduledJob:
+    __slots__ = (
+        "name", "trigger", "callback", "misfire", "exclusive", "next_run", "last_fired", "paused", "missed",
+        "removed"
+    )
+
+    def __init__(
+        self, name: str, trigger, callback: Callable[[], object], misfire: str, exclusive: bool, next_run: float
+    ):
+        self.name = name
+        self.trigger = trigger
+        self.callback = callback
+        self.misfire = misfire
+        self.exclusive = exclusive
+        self.next_run = next_run
+        self.last_fired: Optional[float] = None
+        self.paused = False
+        self.missed = 0
+        self.removed = False
+
+
+class Scheduler:
+    """Runs job callbacks at their trigger times from a single thread"""
+
+    def __init__(self, state=None, coordinator=None):
+        # Optional JobStateStore that persists last scheduled times and pauses
+        self._state = state
+        # Optional ReplicaCoordinator; a run starts only if this replica claims it
+        self._coordinator = coordinator
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def add(
+        self,
+        name: str,
+        trigger,
+        callback: Callable[[], object],
+        misfire: str = "run_once",
+        exclusive: bool = True
+    ) -> ScheduledJob:
+        """
+        Schedule a callback; replaces any job with the same name. Only
+        exclusive jobs are claimed through the coordinator; the others run
+        on every replica.
+        """
+        if misfire not in MISFIRE_POLICIES:
+            raise ValueError(f"Unknown misfire policy for {name}: {misfire}")
+        now = time.time()
+        saved = self._state.get(name) if self._state else None
+        if saved is not None and saved.last_scheduled is not None:
+            # Resume from the last deadline handled before a restart; if any
+            # were missed, the first one is already due
+            next_run = trigger.next_after(saved.last_scheduled)
+        else:
+            next_run = trigger.next_after(now)
+        job = ScheduledJob(name, trigger, callback, misfire, exclusive, next_run)
+        if saved is not None:
+            job.paused = saved.paused
+        with self._lock:
+            previous = self._jobs.get(name)
+            if previous is not None:
+                previous.removed = True
+            self._jobs[name] = job
+            heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+            self._compact()
+        self._wakeup.set()
+        return job
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            job = self._jobs.pop(name, None)
+            if job is None:
+                return False
+            job.removed = True
+            self._compact()
+        self._wakeup.set()
+        return True
+
+    def get(self, name: str) -> Optional[ScheduledJob]:
+        return self._jobs.get(name)
+
+    def pause(self, name: str) -> bool:
+        """Keep the job scheduled but skip its runs until resumed"""
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        job.paused = True
+        if self._state:
+            self._state.set_paused(name, True)
+        return True
+
+    def resume(self, name: str) -> bool:
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        job.paused = False
+        if self._state:
+            self._state.set_paused(name, False)
+        return True
+
+    def jobs(self) -> List[ScheduledJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def next_run(self) -> Optional[float]:
+        with self._lock:
+            self._drop_removed()
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def run(self):
+        """Run due jobs until stop() is called"""
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            for job, runs, scheduled in self._pop_due(time.time()):
+                claimed = (
+                    not runs or not job.exclusive or self._coordinator is None
+                    or self._coordinator.claim(job.name, scheduled)
+                )
+                if not claimed:
+                    logger.info(f"Job {job.name} run at {scheduled} was claimed by another replica")
+                    runs = 0
+                if self._state:
+                    try:
+                        self._state.record_scheduled(job.name, scheduled)
+                    except Exception as e:
+                        logger.error(f"Saving state of {job.name} failed: {e}")
+                for _ in range(runs):
+                    try:
+                        job.callback()
+                    except Exception as e:
+                        logger.error(f"Scheduling {job.name} failed: {e}")
+            next_run = self.next_run()
+            timeout = MAX_SLEEP if next_run is None else min(max(next_run - time.time(), 0), MAX_SLEEP)
+            self._wakeup.wait(timeout)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _pop_due(self, now: float) -> List[Tuple[ScheduledJob, int, float]]:
+        """Due jobs with how many runs to start and the last deadline they cover"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                if job.removed:
+                    continue
+                runs, last_deadline = self._runs_due(job, now)
+                if not job.paused and runs:
+                    job.last_fired = now
+                # Paused and skipped deadlines are still recorded as handled
+                due.append((job, 0 if job.paused else runs, last_deadline))
+                job.next_run = job.trigger.next_after(last_deadline)
+                heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+        return due
+
+    @staticmethod
+    def _runs_due(job: ScheduledJob, now: float) -> Tuple[int, float]:
+        # Every deadline from job.next_run up to now
+        deadlines = 1
+        last_deadline = job.next_run
+        following = job.trigger.next_after(last_deadline)
+        while following <= now and deadlines < MAX_CATCH_UP:
+            deadlines += 1
+            last_deadline = following
+            following = job.trigger.next_after(last_deadline)
+        if following <= now:
+            # More than MAX_CATCH_UP missed; resume from the latest real
+            # deadline. Not from now: leases are claimed per deadline, so it
+            # has to be the same on every replica
+            last_deadline = _latest_deadline(job.trigger, last_deadline, now)
+        lag = now - job.next_run
+        if lag <= MISSED_DEADLINE_TOLERANCE or job.paused:
+            return 1, last_deadline
+
+        job.missed += deadlines
+        if job.misfire == "skip":
+            runs = 0
+        elif job.misfire == "run_all":
+            runs = deadlines
+        else:
+            runs = 1
+        logger.warning(
+            f"Job {job.name} missed {deadlines} deadline(s), the first {lag:.1f}s ago; "
+            f"misfire policy {job.misfire} runs it {runs} time(s)"
+        )
+        return runs, last_deadline
+
+    def _compact(self):
+        # Removed entries are dropped lazily when they reach the top;
+        # rebuild once they make up most of the heap
+        if len(self._heap) > 2 * len(self._jobs) + 64:
+            self._heap = [entry for entry in self._heap if not entry[2].removed]
+            heapq.heapify(self._heap)
+
+    def _drop_removed(self):
+        while self._heap and self._heap[0][2].removed:
+            heapq.heappop(self._heap)
+
+
+def _latest_deadline(trigger, floor: float, now: float) -> float:
+    """The trigger's last deadline at or before now; floor is a known earlier one"""
+    # Widen a window back from now until it holds a deadline, then walk
+    # forward; the walk is only a few steps, however long the outage
+    window = 1.0
+    candidate = floor
+    while now - window > floor:
+        following = trigger.next_after(now - window)
+        if following <= now:
+            candidate = following
+            break
+        window *= 2
+    following = trigger.next_after(candidate)
+    while following <= now:
+        candidate = following
+        following = trigger.next_after(candidate)
+    return candidate
+
+
+_CRONTAB_ENV = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*\s*=")
+
+
+def load_crontab(path: str) -> List[Tuple[str, str, str]]:
+    """Parse a crontab file into (name, cron expression, command) entries"""
+    entries = []
+    names = set()
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#") or _CRONTAB_ENV.match(line):
+                continue
+            if line.startswith("@"):
+                expression, _, command = line.partition(" ")
+            else:
+                fields = line.split(None, 5)
+                if len(fields) < 6:
+                    raise ValueError(f"{path}:{line_number}: expected five time fields and a command")
+                expression, command = " ".join(fields[:5]), fields[5]
+            CronTrigger(expression)
+            # Name the job after the script it runs, e.g. backup_task
+            script = re.search(r"([\w.-]+)\.py\b", command)
+            name = script.group(1) if script else f"crontab-{line_number}"
+            if name in names:
+                name = f"{name}-{line_number}"
+            names.add(name)
+            entries.append((name, expression, command.strip()))
+    return entries
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Job executor for the cron scheduler.
+
+The scheduler loop only submits jobs here and never runs them inline, so a
+slow job cannot delay the others. Each job picks a backend:
+
+- "thread": runs in a shared thread pool. Good for I/O-bound jobs. A thread
+  cannot be killed, so on timeout the run is reported and keeps its slot
+  until it returns.
+- "process": runs in a fresh child process. The number of live processes is
+  bounded by the process pool size. On timeout the child is terminated (then
+  killed), so a runaway job really stops. Process jobs are given as
+  "module:function" and imported in the child.
+- "command": runs a shell command line (e.g. a crontab entry) with the same
+  process slots and timeout handling as "process".
+
+Each job has a max concurrency and an overlap policy for runs submitted
+while it is at that limit: "skip" drops the run, "queue" keeps at most
+`max_queued` runs waiting.
+
+Every run (and every skipped run) is recorded in a bounded history, and
+per-job outcome counts and duration histograms are kept for /metrics.
+"""
+
+import importlib
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from metrics import Histogram
+
+logger = logging.getLogger('cron-executor')
+
+TASK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class JobTimeoutError(Exception):
+    """Raised when a job run exceeds its timeout"""
+
+
+@dataclass
+class JobSpec:
+    name: str
+    func: Union[Callable, str]
+    backend: str = "thread"
+    max_concurrency: int = 1
+    overlap: str = "skip"
+    max_queued: int = 1
+    timeout: Optional[float] = None
+
+    def __post_init__(self):
+        if self.backend not in ("thread", "process", "command"):
+            raise ValueError(f"Unknown backend for {self.name}: {self.backend}")
+        if self.overlap not in ("skip", "queue"):
+            raise ValueError(f"Unknown overlap policy for {self.name}: {self.overlap}")
+        if self.backend == "process" and not isinstance(self.func, str):
+            raise ValueError(f"Process job {self.name} must be given as 'module:function'")
+        if self.backend == "command" and not isinstance(self.func, str):
+            raise ValueError(f"Command job {self.name} must be given as a command line")
+
+
+@dataclass
+class RunRecord:
+    job: str
+    trigger: str
+    started_at: float
+    finished_at: Optional[float] = None
+    duration: Optional[float] = None
+    # running, success, failed, timeout or skipped
+    outcome: str = "running"
+    error: Optional[str] = None
+
+
+class _JobState:
+    def __init__(self):
+        self.running = 0
+        # Trigger names of runs waiting for a free slot
+        self.queued: Deque[str] = deque()
+        self.last_run: Optional[RunRecord] = None
+        self.duration = Histogram()
+
+
+def resolve(target: str) -> Callable:
+    module_name, _, func_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run_task(target: str) -> int:
+    """Run a "module:function" task in this process; exit status 0 unless it failed"""
+    result = resolve(target)()
+    return 1 if result is False else 0
+
+
+class JobExecutor:
+    """Runs registered jobs on thread or process backends with per-job limits"""
+
+    def __init__(
+        self,
+        max_threads: int = 8,
+        max_processes: int = 2,
+        history_size: int = 1000,
+        on_finish: Optional[Callable[[RunRecord], None]] = None
+    ):
+        self.history: Deque[RunRecord] = deque(maxlen=history_size)
+        # Called with every finished run, e.g. to persist the last outcome
+        self.on_finish = on_finish
+        self.outcomes: Dict[Tuple[str, str], int] = {}
+        self._threads = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="cron-job")
+        # Each slot supervises one child process, bounding how many run at once
+        self._process_slots = ThreadPoolExecutor(max_workers=max_processes, thread_name_prefix="cron-proc")
+        self._jobs: Dict[str, JobSpec] = {}
+        self._state: Dict[str, _JobState] = {}
+        self._lock = threading.Lock()
+
+    def register(self, spec: JobSpec) -> JobSpec:
+        self._jobs[spec.name] = spec
+        self._state[spec.name] = _JobState()
+        return spec
+
+    def submit(self, name: str, trigger: str = "schedule") -> bool:
+        """Start (or queue) a run of the job; returns False if the run was skipped"""
+        spec = self._jobs[name]
+        with self._lock:
+            state = self._state[name]
+            if state.running >= spec.max_concurrency:
+                if spec.overlap == "queue" and len(state.queued) < spec.max_queued:
+                    state.queued.append(trigger)
+                    logger.info(f"Job {name} is still running; queued another run")
+                    return True
+                logger.warning(f"Job {name} is still running; skipped this run")
+                now = time.time()
+                self._record(state, RunRecord(name, trigger, now, now, 0.0, "skipped"))
+                return False
+            state.running += 1
+        self._start(spec, trigger)
+        return True
+
+    def jobs(self) -> List[JobSpec]:
+        return list(self._jobs.values())
+
+    def get(self, name: str) -> Optional[JobSpec]:
+        return self._jobs.get(name)
+
+    def is_running(self, name: str) -> bool:
+        return self._state[name].running > 0
+
+    def queued(self, name: str) -> int:
+        return len(self._state[name].queued)
+
+    def last_run(self, name: str) -> Optional[RunRecord]:
+        return self._state[name].last_run
+
+    def duration_histogram(self, name: str) -> Histogram:
+        return self._state[name].duration
+
+    def recent_runs(self, name: Optional[str] = None, limit: int = 100) -> List[RunRecord]:
+        """Newest first, optionally for one job"""
+        # Job threads append while this reads, so filter a copy
+        with self._lock:
+            snapshot = list(self.history)
+        runs = []
+        for record in reversed(snapshot):
+            if name is None or record.job == name:
+                runs.append(record)
+                if len(runs) >= limit:
+                    break
+        return runs
+
+    def shutdown(self, wait: bool = True):
+        self._threads.shutdown(wait=wait)
+        self._process_slots.shutdown(wait=wait)
+
+    def _start(self, spec: JobSpec, trigger: str):
+        if spec.backend in ("process", "command"):
+            self._process_slots.submit(self._run, spec, trigger, self._run_process)
+        else:
+            self._threads.submit(self._run, spec, trigger, self._run_thread)
+
+    def _run(self, spec: JobSpec, trigger: str, runner: Callable):
+        record = RunRecord(spec.name, trigger, time.time())
+        # Visible in the history while it runs
+        with self._lock:
+            self.history.append(record)
+        start = time.monotonic()
+        try:
+            runner(spec)
+            duration = time.monotonic() - start
+            if spec.timeout is not None and duration > spec.timeout:
+                record.outcome, record.error = "timeout", f"exceeded its {spec.timeout}s timeout"
+            else:
+                record.outcome = "success"
+            logger.info(f"Job {spec.name} finished in {duration:.2f}s")
+        except Exception as e:
+            duration = time.monotonic() - start
+            record.outcome = "timeout" if isinstance(e, JobTimeoutError) else "failed"
+            record.error = str(e) or type(e).__name__
+            logger.error(f"Job {spec.name} failed after {duration:.2f}s: {e}")
+        finally:
+            record.finished_at = time.time()
+            record.duration = round(time.monotonic() - start, 3)
+            self._finish(spec, record)
+
+    def _finish(self, spec: JobSpec, record: RunRecord):
+        with self._lock:
+            state = self._state[spec.name]
+            state.duration.observe(record.duration)
+            self._record(state, record, append=False)
+            if state.queued:
+                # Hand the slot straight to the next queued run
+                next_trigger = state.queued.popleft()
+            else:
+                state.running -= 1
+                next_trigger = None
+        if self.on_finish is not None:
+            try:
+                self.on_finish(record)
+            except Exception as e:
+                logger.error(f"Recording run of {spec.name} failed: {e}")
+        if next_trigger is not None:
+            self._start(spec, next_trigger)
+
+    def _record(self, state: _JobState, record: RunRecord, append: bool = True):
+        # Called with self._lock held
+        if append:
+            self.history.append(record)
+        state.last_run = record
+        key = (record.job, record.outcome)
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    @staticmethod
+    def _run_thread(spec: JobSpec):
+        func = resolve(spec.func) if isinstance(spec.func, str) else spec.func
+        if spec.timeout is None:
+            if func() is False:
+                raise RuntimeError("job reported failure")
+            return
+
+        done = threading.Event()
+        watchdog = threading.Timer(
+            spec.timeout,
+            lambda: done.is_set() or logger.error(
+                f"Job {spec.name} exceeded its {spec.timeout}s timeout; "
+                f"thread jobs cannot be killed, so it keeps its slot until it returns"
+            )
+        )
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            result = func()
+        finally:
+            done.set()
+            watchdog.cancel()
+        if result is False:
+            raise RuntimeError("job reported failure")
+
+    @staticmethod
+    def _run_process(spec: JobSpec):
+        if spec.backend == "command":
+            args, shell = spec.func, True
+        else:
+            # A fresh interpreter running this module imports only the task,
+            # not the scheduler (its web server and threads)
+            args, shell = [sys.executable, os.path.abspath(__file__), spec.func], False
+        # Own process group, so a timeout also stops anything the job started
+        process = subprocess.Popen(args, shell=shell, cwd=TASK_DIR, start_new_session=True)
+        try:
+            exit_code = process.wait(timeout=spec.timeout)
+        except subprocess.TimeoutExpired:
+            _signal_group(process, signal.SIGTERM)
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                _signal_group(process, signal.SIGKILL)
+                process.wait()
+            raise JobTimeoutError(f"killed after exceeding its {spec.timeout}s timeout")
+        if exit_code != 0:
+            raise RuntimeError(f"process exited with status {exit_code}")
+
+
+def _signal_group(process: subprocess.Popen, sig: int):
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+if __name__ == "__main__":
+    # Entry point for process jobs: python executor.py module:function
+    sys.exit(run_task(sys.argv[1]))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Concurrent health prober for the platform services.
+
+All targets are checked at the same time over one pooled keep-alive
+httpx client, each with its own deadline, so a hung service no longer
+delays the others. The client lives on a private event loop thread, so its
+connection pool survives between scheduler runs. Every probe is kept in a
+bounded per-service latency history.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger('health-probe')
+
+DEFAULT_TARGETS = (
+    "content-api=http://content-api:80/health,"
+    "user-service=http://user-service:8000/health,"
+    "analytics-service=http://analytics-service:3000/health,"
+    "notification-service=http://notification-service:8080/health"
+)
+
+
+@dataclass
+class ProbeResult:
+    service: str
+    url: str
+    healthy: bool
+    status_code: Optional[int]
+    latency_ms: float
+    error: Optional[str]
+    checked_at: float
+
+
+def parse_targets(value: str) -> Dict[str, str]:
+    """Parse "name=url,name=url" into a mapping (a bare url is named after itself)"""
+    targets = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, url = entry.partition("=")
+        if not sep:
+            name, url = entry, entry
+        targets[name.strip()] = url.strip()
+    return targets
+
+
+class HealthProber:
+    """Probes every target concurrently and keeps per-service latency history"""
+
+    def __init__(self, targets: Dict[str, str], timeout: float = 5.0, history_size: int = 100):
+        self.targets = targets
+        self.timeout = timeout
+        self.history: Dict[str, Deque[ProbeResult]] = {
+            name: deque(maxlen=history_size) for name in targets
+        }
+        # Guards history: probes append on the loop thread while summary()
+        # reads from request threads
+        self._history_lock = threading.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="health-probe", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls) -> "HealthProber":
+        return cls(
+            parse_targets(os.environ.get("HEALTH_CHECK_TARGETS", DEFAULT_TARGETS)),
+            timeout=float(os.environ.get("HEALTH_CHECK_TIMEOUT", "5")),
+            history_size=int(os.environ.get("HEALTH_CHECK_HISTORY", "100"))
+        )
+
+    def probe(self) -> List[ProbeResult]:
+        """Run one round of probes from any thread and wait for all of them"""
+        future = asyncio.run_coroutine_threadsafe(self.probe_all(), self._loop)
+        # Every probe has its own deadline; the margin only covers scheduling
+        return future.result(timeout=self.timeout + 5)
+
+    async def probe_all(self) -> List[ProbeResult]:
+        if self._client is None:
+            limits = httpx.Limits(max_keepalive_connections=len(self.targets) or 1)
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+        results = await asyncio.gather(
+            *(self._probe_one(name, url) for name, url in self.targets.items())
+        )
+        with self._history_lock:
+            for result in results:
+                self.history[result.service].append(result)
+        return list(results)
+
+    async def _probe_one(self, name: str, url: str) -> ProbeResult:
+        start = time.perf_counter()
+        status_code = None
+        error = None
+        try:
+            response = await asyncio.wait_for(self._client.get(url), timeout=self.timeout)
+            status_code = response.status_code
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout}s"
+        except httpx.HTTPError as e:
+            error = str(e) or type(e).__name__
+        except Exception as e:
+            # e.g. httpx.InvalidURL from a bad target; only this target fails
+            error = f"{type(e).__name__}: {e}"
+        latency_ms = (time.perf_counter() - start) * 1000
+        return ProbeResult(
+            service=name,
+            url=url,
+            healthy=status_code == 200,
+            status_code=status_code,
+            latency_ms=round(latency_ms, 2),
+            error=error,
+            checked_at=time.time()
+        )
+
+    def summary(self) -> Dict[str, dict]:
+        """Latest result and latency statistics over the recorded history"""
+        with self._history_lock:
+            snapshot = {name: list(results) for name, results in self.history.items()}
+        summary = {}
+        for name, results in snapshot.items():
+            latencies = sorted(r.latency_ms for r in results)
+            latest = results[-1] if results else None
+            summary[name] = {
+                "url": self.targets[name],
+                "healthy": latest.healthy if latest else None,
+                "last_status_code": latest.status_code if latest else None,
+                "last_error": latest.error if latest else None,
+                "last_checked_at": latest.checked_at if latest else None,
+                "samples": len(latencies),
+                "availability": (
+                    round(sum(r.healthy for r in results) / len(results), 3) if results else None
+                ),
+                "latency_ms": {
+                    "last": latest.latency_ms if latest else None,
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+                    "max": latencies[-1] if latencies else None
+                }
+            }
+        return summary
+
+    def close(self):
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    prober = HealthProber.from_env()
+    for result in prober.probe():
+        logger.info(f"{result.service}: healthy={result.healthy} latency={result.latency_ms}ms error={result.error}")
+    prober.close()
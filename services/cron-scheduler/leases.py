@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Lease-based coordination between cron-scheduler replicas.
+
+A lease is a lock with an owner and an expiry: whoever holds an unexpired
+lease on a key owns it, and a crashed owner's lease simply runs out. Every
+replica computes the same deadlines (cron times and epoch-aligned
+intervals), so before starting a scheduled run a replica claims the lease
+"run:<job>:<deadline>". Only the first claim succeeds, so each deadline
+fires exactly once however many replicas are running.
+
+Jobs can also be hash-sharded across replicas (REPLICA_INDEX of
+REPLICA_COUNT), so each replica schedules only its share. Sharding needs no
+shared storage; claims need a lease store every replica can reach.
+
+The first LeaseStore is a SQLite file, which works for replicas sharing a
+host or volume and for local testing. Redis or a Kubernetes Lease can
+implement the same interface.
+"""
+
+import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+logger = logging.getLogger('cron-leases')
+
+LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+SELECT_LEASE = "SELECT owner, expires_at FROM leases WHERE key = ?"
+UPSERT_LEASE = "INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)"
+DELETE_LEASE = "DELETE FROM leases WHERE key = ? AND owner = ?"
+DELETE_EXPIRED = "DELETE FROM leases WHERE expires_at < ?"
+
+# Expired leases are purged after this many acquisitions
+PURGE_EVERY = 100
+
+
+class LeaseStore:
+    """Interface for lease backends"""
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Take or renew the lease; False if another owner holds it unexpired"""
+        raise NotImplementedError
+
+    def release(self, key: str, owner: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """Leases in a SQLite file shared by the replicas"""
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; acquire opens its own write transaction
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        self._conn.execute(LEASE_SCHEMA)
+        self._lock = threading.Lock()
+        self._acquisitions = 0
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # The write lock makes check-and-set atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(SELECT_LEASE, (key,)).fetchone()
+                if row is not None and row[0] != owner and row[1] > now:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute(UPSERT_LEASE, (key, owner, now + ttl))
+                self._acquisitions += 1
+                if self._acquisitions % PURGE_EVERY == 0:
+                    self._conn.execute(DELETE_EXPIRED, (now,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return True
+
+    def release(self, key: str, owner: str):
+        with self._lock:
+            self._conn.execute(DELETE_LEASE, (key, owner))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def shard_of(name: str, count: int) -> int:
+    # crc32 rather than hash(), which differs between processes
+    return zlib.crc32(name.encode()) % count
+
+
+class ReplicaCoordinator:
+    """Decides which scheduled runs this replica starts"""
+
+    def __init__(
+        self,
+        leases: Optional[LeaseStore] = None,
+        replica_id: Optional[str] = None,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        claim_ttl: float = 24 * 3600
+    ):
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Replica index {shard_index} is outside 0-{shard_count - 1}")
+        self.leases = leases
+        self.replica_id = replica_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        # Claims only need to outlive clock skew and restarts around a deadline
+        self.claim_ttl = claim_ttl
+
+    @classmethod
+    def from_env(cls) -> "ReplicaCoordinator":
+        lease_path = os.environ.get("LEASE_DB_PATH")
+        shard_count = int(os.environ.get("REPLICA_COUNT", "1"))
+        index = os.environ.get("REPLICA_INDEX")
+        if index is None and shard_count > 1:
+            # StatefulSet pods are named <name>-<ordinal>
+            match = re.search(r"-(\d+)$", socket.gethostname())
+            index = match.group(1) if match else "0"
+        return cls(
+            SQLiteLeaseStore(lease_path) if lease_path else None,
+            replica_id=os.environ.get("REPLICA_ID"),
+            shard_index=int(index or 0),
+            shard_count=shard_count,
+            claim_ttl=float(os.environ.get("LEASE_CLAIM_TTL", str(24 * 3600)))
+        )
+
+    def owns(self, job: str) -> bool:
+        """Whether this replica's shard schedules the job"""
+        return self.shard_count <= 1 or shard_of(job, self.shard_count) == self.shard_index
+
+    def claim(self, job: str, deadline: float) -> bool:
+        """Claim one scheduled run; only one replica succeeds per deadline"""
+        if self.leases is None:
+            return True
+        try:
+            return self.leases.acquire(f"run:{job}:{deadline:.3f}", self.replica_id, self.claim_ttl)
+        except sqlite3.Error as e:
+            # Better to miss a run than to risk running it on every replica
+            logger.error(f"Claiming {job} at {deadline} failed: {e}")
+            return False
+
+    def describe(self) -> dict:
+        return {
+            "replica_id": self.replica_id,
+            "shard_index": self.shard_index,
+            "shard_count": self.shard_count,
+            "leases": type(self.leases).__name__ if self.leases else None
+        }
+
+    def close(self):
+        if self.leases is not None:
+            self.leases.close()
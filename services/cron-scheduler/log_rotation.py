@@ -1,14 +1,40 @@
 #!/usr/bin/env python3
 """
 Log rotation task for Multi-Everything DevOps Platform
-Runs daily at 5 AM via cron
+Runs daily at 5 AM via cron, and whenever a log outgrows
+LOG_ROTATION_MAX_BYTES (checked by the scheduler with os.stat)
+
+Live files are renamed atomically and recreated empty, then writers are
+told to reopen them (LOG_ROTATION_POSTROTATE command, SIGHUP, or a
+WatchedFileHandler noticing the new inode). Like logrotate's
+delaycompress, a renamed file is only compressed by the next rotation:
+writers that never reopen (e.g. a command appending with ">>", including
+this task's own output) keep writing to it until they exit, so no line is
+lost. Files are compressed concurrently in parallel blocks on a shared
+worker pool (see compression.py). Rotations run one at a time, whether
+daily or size-triggered (a file lock, LOG_ROTATION_LOCK).
+
+Configured through env: LOG_ROTATION_FILES (comma-separated paths),
+LOG_ROTATION_MODE (rename or copytruncate), LOG_ROTATION_DELAYCOMPRESS
+(default 1), LOG_ROTATION_CODEC (gzip or zstd), LOG_ROTATION_LEVEL,
+LOG_ROTATION_WORKERS (compression threads) and LOG_ROTATION_FILE_WORKERS
+(files rotated at once).
 """
 
+import fcntl
 import os
 import logging
-import gzip
-import shutil
-from datetime import datetime, timedelta
+import re
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from cleanup_engine import CleanupRule, dry_run_from_env, run_rules
+from compression import ParallelCompressor
 
 # Setup logging
 logging.basicConfig(
@@ -17,63 +43,233 @@ logging.basicConfig(
 )
 logger = logging.getLogger('log-rotation')
 
-def rotate_logs():
-    """Rotate and compress old log files"""
+DEFAULT_LOG_FILES = "/var/log/cron.log,/var/log/application.log"
+
+# Suffix _rotated_name gives a renamed, not yet compressed file
+_STAGED_SUFFIX = re.compile(r"\.\d{8}-\d{6}(\.\d+)?$")
+
+def reopen_file_handlers():
+    """Make every logging.FileHandler reopen its file on the next record"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler):
+            handler.acquire()
+            try:
+                handler.close()
+            finally:
+                handler.release()
+
+def install_reopen_signal(signum=signal.SIGHUP):
+    """Reopen this process's log files when it receives signum (main thread only)"""
+    signal.signal(signum, lambda *_: reopen_file_handlers())
+
+def log_files_from_env():
+    return [
+        path.strip() for path in os.environ.get("LOG_ROTATION_FILES", DEFAULT_LOG_FILES).split(",")
+        if path.strip()
+    ]
+
+def oversized_logs(max_bytes, log_files=None):
+    """Log files larger than max_bytes; a single os.stat per file"""
+    oversized = []
+    for log_file in log_files or log_files_from_env():
+        try:
+            if os.stat(log_file).st_size > max_bytes:
+                oversized.append(log_file)
+        except FileNotFoundError:
+            pass
+    return oversized
+
+def _rotated_name(log_file):
+    # Second resolution, since size triggers can rotate several times a day
+    base = f"{log_file}.{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    rotated, n = base, 1
+    while any(os.path.exists(rotated + ext) for ext in ("", ".gz", ".zst")):
+        rotated, n = f"{base}.{n}", n + 1
+    return rotated
+
+def _rename_live_file(log_file):
+    """Atomically move the live file aside and recreate it empty"""
+    staged = _rotated_name(log_file)
+    mode = os.stat(log_file).st_mode
+    # Writers keep their descriptor, so nothing is lost: lines land in the
+    # staged file until the writer reopens the path
+    os.rename(log_file, staged)
+    fd = os.open(log_file, os.O_CREAT | os.O_WRONLY | os.O_APPEND, mode & 0o777)
+    os.close(fd)
+    return staged
+
+def _staged_files(log_file):
+    """Files renamed by earlier rotations and not compressed yet"""
+    directory, name = os.path.split(log_file)
+    try:
+        entries = list(os.scandir(directory or "."))
+    except FileNotFoundError:
+        return []
+    return sorted(
+        entry.path for entry in entries
+        if entry.name.startswith(name + ".") and _STAGED_SUFFIX.fullmatch(entry.name[len(name):])
+        and entry.is_file(follow_symlinks=False)
+    )
+
+@contextmanager
+def _rotation_lock():
+    """Serialize rotations across processes (daily and size-triggered jobs)"""
+    with open(os.environ.get("LOG_ROTATION_LOCK", "/tmp/log_rotation.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _run_postrotate():
+    # External writers are signalled through a shell command,
+    # e.g. "kill -HUP $(cat app.pid)"
+    command = os.environ.get("LOG_ROTATION_POSTROTATE")
+    if command:
+        result = subprocess.run(command, shell=True)
+        if result.returncode != 0:
+            logger.warning(f"Postrotate command exited with status {result.returncode}")
+
+def _compress_staged(log_file, staged, compressor):
+    rotated_file = staged + compressor.extension
+    result = compressor.compress_file(staged, rotated_file)
+    os.remove(staged)
+    _log_rotated(log_file, rotated_file, result)
+    return result
+
+def _copy_truncate(log_file, compressor):
+    # Lines written between the copy and the truncate are lost; only for
+    # writers that can never reopen their file
+    rotated_file = _rotated_name(log_file) + compressor.extension
+    result = compressor.compress_file(log_file, rotated_file)
+    open(log_file, 'w').close()
+    _log_rotated(log_file, rotated_file, result)
+    return result
+
+def _log_rotated(log_file, rotated_file, result):
+    logger.info(
+        f"Rotated: {log_file} -> {rotated_file} "
+        f"({result.bytes_in / 1024 / 1024:.1f} MB, ratio {result.ratio:.2f}, "
+        f"{result.mb_per_second:.1f} MB/s)"
+    )
+
+def rotate_logs(min_bytes=0):
+    """Rotate and compress log files larger than min_bytes"""
     try:
         logger.info("Starting log rotation task...")
-        
-        # Define log files to rotate
-        log_files = [
-            "/var/log/cron.log",
-            "/var/log/application.log"
-        ]
-        
-        rotated_count = 0
-        
-        for log_file in log_files:
-            if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
-                # Create rotated filename with timestamp
-                timestamp = datetime.now().strftime("%Y%m%d")
-                rotated_file = f"{log_file}.{timestamp}.gz"
-                
-                # Compress and rotate the log file
-                with open(log_file, 'rb') as f_in:
-                    with gzip.open(rotated_file, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                
-                # Clear the original log file
-                open(log_file, 'w').close()
-                
-                rotated_count += 1
-                logger.info(f"Rotated: {log_file} -> {rotated_file}")
-        
-        # Cleanup old rotated logs (older than 30 days)
-        cleanup_old_rotated_logs()
-        
-        logger.info(f"Log rotation completed. Rotated {rotated_count} files.")
-        return True
+        with _rotation_lock():
+            return _rotate_logs(min_bytes)
         
     except Exception as e:
         logger.error(f"Log rotation task failed: {e}")
         return False
 
+def _rotate_logs(min_bytes):
+    # Define log files to rotate; sizes are checked after taking the lock,
+    # so a rotation that just finished is not repeated
+    configured = log_files_from_env()
+    log_files = oversized_logs(max(min_bytes, 0), configured)
+    
+    # rename (default): atomic rename, postrotate, compress on the next run
+    # copytruncate: the old copy-then-truncate, for writers that cannot reopen
+    mode = os.environ.get("LOG_ROTATION_MODE", "rename")
+    if mode not in ("rename", "copytruncate"):
+        raise ValueError(f"Unknown LOG_ROTATION_MODE: {mode}")
+    delaycompress = os.environ.get("LOG_ROTATION_DELAYCOMPRESS", "1").lower() in ("1", "true", "yes")
+    
+    level = os.environ.get("LOG_ROTATION_LEVEL")
+    workers = os.environ.get("LOG_ROTATION_WORKERS")
+    compressor = ParallelCompressor(
+        codec=os.environ.get("LOG_ROTATION_CODEC", "gzip"),
+        level=int(level) if level else None,
+        workers=int(workers) if workers else None
+    )
+    file_workers = int(os.environ.get("LOG_ROTATION_FILE_WORKERS", "4"))
+    
+    results = []
+    failed = 0
+    start = datetime.now()
+    
+    staged = []
+    to_compress = []
+    if mode == "rename":
+        # Files renamed by the previous rotation: anything that still had
+        # them open (a ">>" redirect, a writer that ignored postrotate) has
+        # exited or reopened by now, unless they were written to moments ago
+        grace = float(os.environ.get("LOG_ROTATION_REOPEN_GRACE", "1"))
+        if delaycompress:
+            to_compress = [
+                (log_file, staged_file) for log_file in configured for staged_file in _staged_files(log_file)
+                if time.time() - os.stat(staged_file).st_mtime > grace
+            ]
+        for log_file in log_files:
+            try:
+                staged.append((log_file, _rename_live_file(log_file)))
+            except OSError as e:
+                failed += 1
+                logger.error(f"Could not rotate {log_file}: {e}")
+        if staged:
+            _run_postrotate()
+            if delaycompress:
+                for log_file, staged_file in staged:
+                    logger.info(f"Rotated: {log_file} -> {staged_file} (compressed on the next rotation)")
+            else:
+                # Let writers that check their file per record (WatchedFileHandler)
+                # finish anything already in flight to the renamed file
+                time.sleep(grace)
+                to_compress.extend(staged)
+    
+    with compressor, ThreadPoolExecutor(max_workers=max(1, min(file_workers, len(to_compress) or len(log_files) or 1))) as pool:
+        if mode == "rename":
+            futures = {
+                pool.submit(_compress_staged, log_file, staged_file, compressor): staged_file
+                for log_file, staged_file in to_compress
+            }
+        else:
+            futures = {pool.submit(_copy_truncate, log_file, compressor): log_file for log_file in log_files}
+        for future, log_file in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failed += 1
+                logger.error(f"Could not rotate {log_file}: {e}")
+    elapsed = (datetime.now() - start).total_seconds()
+    
+    # Cleanup old rotated logs (older than 30 days)
+    cleanup_old_rotated_logs()
+    
+    total_in = sum(r.bytes_in for r in results)
+    total_out = sum(r.bytes_out for r in results)
+    logger.info(
+        f"Log rotation completed. Renamed {len(staged)}, compressed {len(results)} files: "
+        f"{total_in / 1024 / 1024:.1f} MB -> {total_out / 1024 / 1024:.1f} MB "
+        f"in {elapsed:.2f}s ({total_in / 1024 / 1024 / elapsed if elapsed else 0:.1f} MB/s, "
+        f"{compressor.codec} level {compressor.level}, {compressor.workers} threads)"
+    )
+    return failed == 0
+
+def rotate_oversized_logs():
+    """Rotate only the logs above LOG_ROTATION_MAX_BYTES (the size trigger)"""
+    return rotate_logs(min_bytes=int(os.environ.get("LOG_ROTATION_MAX_BYTES", str(512 * 1024 * 1024))))
+
 def cleanup_old_rotated_logs():
     """Remove rotated logs older than 30 days"""
     try:
-        log_dir = "/var/log"
-        cutoff_date = datetime.now() - timedelta(days=30)
-        
-        for filename in os.listdir(log_dir):
-            if filename.endswith('.gz') and '.log.' in filename:
-                filepath = os.path.join(log_dir, filename)
-                file_time = datetime.fromtimestamp(os.path.getctime(filepath))
-                
-                if file_time < cutoff_date:
-                    os.remove(filepath)
-                    logger.info(f"Removed old log: {filename}")
+        rule = CleanupRule(
+            "rotated-logs",
+            os.environ.get("LOG_ROTATION_DIR", "/var/log"),
+            patterns=("*.log.*.gz", "*.log.*.zst"),
+            min_age_days=float(os.environ.get("LOG_RETENTION_DAYS", "30")),
+            age_field="ctime"
+        )
+        dry_run = dry_run_from_env()
+        for report in run_rules([rule], dry_run=dry_run, workers=2):
+            for path in report.paths:
+                logger.info(f"Would remove old log: {path}")
                     
     except Exception as e:
         logger.warning(f"Could not cleanup old logs: {e}")
 
 if __name__ == "__main__":
-    rotate_logs()
\ No newline at end of file
+    # Non-zero exit status, so the scheduler records the run as failed
+    sys.exit(0 if rotate_logs() else 1)
\ No newline at end of file
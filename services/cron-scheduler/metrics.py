@@ -0,0 +1,95 @@
+"""
+Prometheus-style metrics for the cron scheduler.
+
+Job durations go into fixed-bucket histograms (one bisect per run), and run
+outcomes and missed deadlines are plain counters. /metrics renders them in
+the Prometheus text exposition format.
+"""
+
+import bisect
+import time
+from typing import Iterable, List, Tuple
+
+# Job duration buckets in seconds, from 100 ms to 4 h
+DURATION_BUCKETS = (
+    0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 14400.0
+)
+
+STARTED = time.time()
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds observations <= bounds[i], the last one +Inf"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = DURATION_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def render(executor, scheduler, extra: Iterable[Tuple[str, str, str, float]] = ()) -> str:
+    """Render job metrics plus extra (name, type, help, value) samples as Prometheus text"""
+    lines: List[str] = []
+
+    lines.append("# HELP cron_scheduler_job_runs_total Finished and skipped job runs by outcome")
+    lines.append("# TYPE cron_scheduler_job_runs_total counter")
+    for (job, outcome), count in sorted(executor.outcomes.items()):
+        lines.append(f"cron_scheduler_job_runs_total{_labels(job=job, outcome=outcome)} {count}")
+
+    specs = sorted(executor.jobs(), key=lambda spec: spec.name)
+
+    lines.append("# HELP cron_scheduler_job_duration_seconds Job run duration")
+    lines.append("# TYPE cron_scheduler_job_duration_seconds histogram")
+    for spec in specs:
+        histogram = executor.duration_histogram(spec.name)
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+            cumulative += bucket_count
+            labels = _labels(job=spec.name, le=repr(float(bound)))
+            lines.append(f"cron_scheduler_job_duration_seconds_bucket{labels} {cumulative}")
+        lines.append(f"cron_scheduler_job_duration_seconds_bucket{_labels(job=spec.name, le='+Inf')} {histogram.count}")
+        lines.append(f"cron_scheduler_job_duration_seconds_sum{_labels(job=spec.name)} {histogram.sum}")
+        lines.append(f"cron_scheduler_job_duration_seconds_count{_labels(job=spec.name)} {histogram.count}")
+
+    lines.append("# HELP cron_scheduler_job_running Runs of the job currently in progress")
+    lines.append("# TYPE cron_scheduler_job_running gauge")
+    for spec in specs:
+        running = 1 if executor.is_running(spec.name) else 0
+        lines.append(f"cron_scheduler_job_running{_labels(job=spec.name)} {running}")
+
+    scheduled = sorted(scheduler.jobs(), key=lambda job: job.name)
+
+    lines.append("# HELP cron_scheduler_job_missed_deadlines_total Runs fired later than their scheduled time")
+    lines.append("# TYPE cron_scheduler_job_missed_deadlines_total counter")
+    for job in scheduled:
+        lines.append(f"cron_scheduler_job_missed_deadlines_total{_labels(job=job.name)} {job.missed}")
+
+    lines.append("# HELP cron_scheduler_job_next_run_timestamp_seconds Next scheduled run (Unix time)")
+    lines.append("# TYPE cron_scheduler_job_next_run_timestamp_seconds gauge")
+    for job in scheduled:
+        lines.append(f"cron_scheduler_job_next_run_timestamp_seconds{_labels(job=job.name)} {job.next_run}")
+
+    samples = [
+        ("cron_scheduler_jobs", "gauge", "Scheduled jobs", len(scheduled)),
+        ("cron_scheduler_jobs_paused", "gauge", "Scheduled jobs that are paused", sum(job.paused for job in scheduled)),
+        ("cron_scheduler_uptime_seconds", "gauge", "Seconds since the scheduler started", time.time() - STARTED),
+        *extra
+    ]
+    for name, metric_type, help_text, value in samples:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -1,25 +1,41 @@
-import schedule
-import time
-import requests
+import os
 import logging
+import logging.handlers
+from dataclasses import asdict, replace
 from datetime import datetime
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 import uvicorn
 import threading
+from functools import partial
 
-# Setup logging
+from engine import MAX_CATCH_UP, CronTrigger, IntervalTrigger, Scheduler, load_crontab
+from executor import JobExecutor, JobSpec, RunRecord
+from health_probe import HealthProber
+from leases import ReplicaCoordinator
+from state import JobStateStore
+import metrics
+
+# Setup logging; WatchedFileHandler reopens cron.log once log rotation renames it
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('/var/log/cron.log'),
+        logging.handlers.WatchedFileHandler('/var/log/cron.log'),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger('cron-scheduler')
 
+# Imported after logging is configured, which makes its basicConfig a no-op
+import log_rotation
+
 app = FastAPI(title="Cron Scheduler Service")
 
+# Targets come from HEALTH_CHECK_TARGETS ("name=url,..."), defaulting to the platform services
+health_prober = HealthProber.from_env()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -27,9 +43,103 @@ async def health_check():
         "status": "healthy",
         "service": "cron-scheduler",
         "timestamp": datetime.utcnow().isoformat(),
-        "active_jobs": len(schedule.get_jobs())
+        "active_jobs": len(job_scheduler),
+        "replica": coordinator.describe()
+    }
+
+# Latest probe result and latency history per service
+@app.get("/health/services")
+async def service_health():
+    return health_prober.summary()
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+def _run_to_dict(record: Optional[RunRecord]) -> Optional[dict]:
+    if record is None:
+        return None
+    run = asdict(record)
+    run["started_at"] = _iso(record.started_at)
+    run["finished_at"] = _iso(record.finished_at)
+    return run
+
+def _job_to_dict(name: str) -> dict:
+    spec = executor.get(name)
+    scheduled = job_scheduler.get(name)
+    last_run = _run_to_dict(executor.last_run(name))
+    saved = job_state.get(name)
+    if last_run is None and saved is not None and saved.last_outcome is not None:
+        # Nothing has run since the restart; report the persisted outcome
+        last_run = {
+            "job": name,
+            "started_at": _iso(saved.last_started),
+            "finished_at": _iso(saved.last_finished),
+            "outcome": saved.last_outcome,
+            "error": saved.last_error
+        }
+    return {
+        "name": name,
+        "schedule": repr(scheduled.trigger) if scheduled else None,
+        "backend": spec.backend,
+        "timeout": spec.timeout,
+        "overlap": spec.overlap,
+        "paused": scheduled.paused if scheduled else None,
+        "misfire": scheduled.misfire if scheduled else None,
+        "running": executor.is_running(name),
+        "queued": executor.queued(name),
+        "next_run": _iso(scheduled.next_run) if scheduled else None,
+        "last_fired": _iso(scheduled.last_fired) if scheduled else None,
+        "missed_deadlines": scheduled.missed if scheduled else 0,
+        "last_run": last_run
     }
 
+def _require_job(name: str):
+    if executor.get(name) is None:
+        raise HTTPException(status_code=404, detail=f"Job {name} not found")
+
+# Registered jobs with their next and last runs
+@app.get("/jobs")
+async def list_jobs():
+    return [_job_to_dict(spec.name) for spec in executor.jobs()]
+
+@app.get("/jobs/{name}")
+async def get_job(name: str, limit: int = Query(20, ge=1, le=1000)):
+    _require_job(name)
+    job = _job_to_dict(name)
+    job["history"] = [_run_to_dict(record) for record in executor.recent_runs(name, limit)]
+    return job
+
+# Run a job now, outside its schedule
+@app.post("/jobs/{name}/run", status_code=202)
+async def trigger_job(name: str):
+    _require_job(name)
+    if not executor.submit(name, trigger="manual"):
+        raise HTTPException(status_code=409, detail=f"Job {name} is already running")
+    return _job_to_dict(name)
+
+@app.post("/jobs/{name}/pause")
+async def pause_job(name: str):
+    _require_job(name)
+    if not job_scheduler.pause(name):
+        raise HTTPException(status_code=409, detail=f"Job {name} is not scheduled")
+    return _job_to_dict(name)
+
+@app.post("/jobs/{name}/resume")
+async def resume_job(name: str):
+    _require_job(name)
+    if not job_scheduler.resume(name):
+        raise HTTPException(status_code=409, detail=f"Job {name} is not scheduled")
+    return _job_to_dict(name)
+
+# Recent runs across all jobs, newest first (bounded by JOB_HISTORY_SIZE)
+@app.get("/runs")
+async def list_runs(job: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    return [_run_to_dict(record) for record in executor.recent_runs(job, limit)]
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return metrics.render(executor, job_scheduler)
+
 # Scheduled task: Cleanup old data
 def cleanup_old_data():
     logger.info("Running cleanup_old_data task")
@@ -53,44 +163,127 @@ def generate_daily_reports():
 # Scheduled task: Health check other services
 def health_check_services():
     logger.info("Running health_check_services task")
-    services = [
-        "http://content-api:80/health",
-        "http://user-service:8000/health",
-        "http://analytics-service:3000/health",
-        "http://notification-service:8080/health"
-    ]
-    
-    for service_url in services:
-        try:
-            response = requests.get(service_url, timeout=5)
-            if response.status_code == 200:
-                logger.info(f"Service {service_url} is healthy")
-            else:
-                logger.warning(f"Service {service_url} returned status {response.status_code}")
-        except Exception as e:
-            logger.error(f"Service {service_url} health check failed: {e}")
+    try:
+        results = health_prober.probe()
+    except Exception as e:
+        logger.error(f"Health check round failed: {e}")
+        return
+
+    for result in results:
+        if result.healthy:
+            logger.info(f"Service {result.url} is healthy ({result.latency_ms}ms)")
+        elif result.status_code is not None:
+            logger.warning(f"Service {result.url} returned status {result.status_code}")
+        else:
+            logger.error(f"Service {result.url} health check failed: {result.error}")
+
+# Scheduled task: Rotate logs early once one outgrows LOG_ROTATION_MAX_BYTES
+LOG_ROTATION_MAX_BYTES = int(os.environ.get("LOG_ROTATION_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def check_log_sizes():
+    # One os.stat per file, so this can run every few seconds
+    oversized = log_rotation.oversized_logs(LOG_ROTATION_MAX_BYTES)
+    if oversized:
+        logger.info(f"Logs over {LOG_ROTATION_MAX_BYTES} bytes: {', '.join(oversized)}")
+        executor.submit("log_rotation_size", trigger="size")
+
+# Last scheduled time, pause flag and last outcome per job survive restarts
+job_state = JobStateStore(os.environ.get("JOB_STATE_PATH", "/var/lib/cron-scheduler/job_state.db"))
+
+# What to do with runs missed while the scheduler was down: run_once, run_all or skip
+DEFAULT_MISFIRE_POLICY = os.environ.get("MISFIRE_POLICY", "run_once")
+
+# Jobs run on the executor so a slow one never delays the others
+executor = JobExecutor(
+    max_threads=int(os.environ.get("JOB_THREADS", "8")),
+    max_processes=int(os.environ.get("JOB_PROCESSES", "2")),
+    history_size=int(os.environ.get("JOB_HISTORY_SIZE", "1000")),
+    on_finish=job_state.record_run
+)
+
+# Several replicas can run: LEASE_DB_PATH (a shared SQLite file) makes each
+# deadline fire on one replica only, REPLICA_INDEX/REPLICA_COUNT shard the jobs
+coordinator = ReplicaCoordinator.from_env()
+
+# The engine only decides when jobs are due and hands them to the executor
+job_scheduler = Scheduler(state=job_state, coordinator=coordinator)
+
+# crontab entries (backup, cleanup, log rotation) run in the same engine
+CRONTAB_PATH = os.environ.get(
+    "CRONTAB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "crontab")
+)
+CRON_COMMAND_TIMEOUT = float(os.environ.get("CRON_COMMAND_TIMEOUT", "3600"))
+# Crontab jobs (named after their script) that need longer than that
+CRON_JOB_TIMEOUTS = {
+    "backup_task": float(os.environ.get("BACKUP_TIMEOUT", str(4 * 3600)))
+}
+
+# Jobs that work on this pod's own files run on every replica, unsharded and unclaimed
+PER_REPLICA_JOBS = set(
+    name.strip() for name in os.environ.get("PER_REPLICA_JOBS", "log_rotation,cleanup_task").split(",")
+    if name.strip()
+)
+
+def schedule_job(spec, trigger, misfire=None, per_replica=False):
+    misfire = misfire or DEFAULT_MISFIRE_POLICY
+    per_replica = per_replica or spec.name in PER_REPLICA_JOBS
+    if misfire == "run_all":
+        # Catch-up runs are submitted back to back; queue them instead of skipping
+        spec = replace(spec, overlap="queue", max_queued=MAX_CATCH_UP)
+    executor.register(spec)
+    # Jobs of other shards stay registered, so they can still be triggered by hand
+    if per_replica or coordinator.owns(spec.name):
+        job_scheduler.add(
+            spec.name, trigger, partial(executor.submit, spec.name), misfire, exclusive=not per_replica
+        )
 
 # Setup scheduled tasks
 def setup_schedules():
     # Run every day at 2 AM
-    schedule.every().day.at("02:00").do(cleanup_old_data)
+    schedule_job(JobSpec("cleanup_old_data", cleanup_old_data, timeout=3600), CronTrigger("0 2 * * *"))
     
     # Run every day at 6 AM
-    schedule.every().day.at("06:00").do(generate_daily_reports)
+    schedule_job(JobSpec("generate_daily_reports", generate_daily_reports, timeout=3600), CronTrigger("0 6 * * *"))
     
-    # Run every 5 minutes
-    schedule.every(5).minutes.do(health_check_services)
+    # Run every 5 minutes; probes have their own deadlines, a round still going is skipped
+    # and probes missed during a restart are not worth catching up
+    schedule_job(
+        JobSpec("health_check_services", health_check_services, overlap="skip", timeout=60),
+        IntervalTrigger(5 * 60),
+        misfire="skip"
+    )
+
+    # Check log sizes every LOG_SIZE_CHECK_INTERVAL seconds and rotate oversized
+    # logs right away instead of waiting for the daily rotation
+    executor.register(JobSpec(
+        "log_rotation_size", "log_rotation:rotate_oversized_logs", backend="process", timeout=CRON_COMMAND_TIMEOUT
+    ))
+    schedule_job(
+        JobSpec("log_size_check", check_log_sizes, overlap="skip", timeout=30),
+        IntervalTrigger(float(os.environ.get("LOG_SIZE_CHECK_INTERVAL", "30"))),
+        misfire="skip",
+        per_replica=True
+    )
+
+    # Commands from the crontab run as child processes that are killed on timeout
+    if os.path.exists(CRONTAB_PATH):
+        for name, expression, command in load_crontab(CRONTAB_PATH):
+            schedule_job(
+                JobSpec(name, command, backend="command", timeout=CRON_JOB_TIMEOUTS.get(name, CRON_COMMAND_TIMEOUT)),
+                CronTrigger(expression)
+            )
     
-    logger.info("Scheduled tasks configured")
+    logger.info(f"Scheduled tasks configured: {len(job_scheduler)} jobs")
 
 # Run scheduler in separate thread
 def run_scheduler():
     setup_schedules()
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    job_scheduler.run()
 
 if __name__ == "__main__":
+    # kill -HUP reopens the log files, for rotation tools outside this service
+    log_rotation.install_reopen_signal()
+    
     # Start scheduler in background thread
     scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
     scheduler_thread.start()
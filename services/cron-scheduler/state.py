@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Persistent job state for the cron scheduler.
+
+One row per job in a small SQLite file: the last scheduled time the engine
+fired, whether the job is paused, and how its last run ended. Rows are
+updated in place, so startup reads a table the size of the job list rather
+than replaying a log. The engine uses the last fired time to find runs
+missed while the scheduler was down.
+"""
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_state (
+    name TEXT PRIMARY KEY,
+    last_scheduled REAL,
+    paused INTEGER NOT NULL DEFAULT 0,
+    last_started REAL,
+    last_finished REAL,
+    last_outcome TEXT,
+    last_error TEXT
+) WITHOUT ROWID
+"""
+
+SELECT_ALL = (
+    "SELECT name, last_scheduled, paused, last_started, last_finished, last_outcome, last_error "
+    "FROM job_state"
+)
+UPSERT_SCHEDULED = (
+    "INSERT INTO job_state (name, last_scheduled) VALUES (?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET last_scheduled = excluded.last_scheduled"
+)
+UPSERT_PAUSED = (
+    "INSERT INTO job_state (name, paused) VALUES (?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET paused = excluded.paused"
+)
+UPSERT_RUN = (
+    "INSERT INTO job_state (name, last_started, last_finished, last_outcome, last_error) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET last_started = excluded.last_started, "
+    "last_finished = excluded.last_finished, last_outcome = excluded.last_outcome, "
+    "last_error = excluded.last_error"
+)
+
+
+@dataclass
+class JobState:
+    name: str
+    last_scheduled: Optional[float] = None
+    paused: bool = False
+    last_started: Optional[float] = None
+    last_finished: Optional[float] = None
+    last_outcome: Optional[str] = None
+    last_error: Optional[str] = None
+
+
+class JobStateStore:
+    """SQLite-backed job state, cached in memory after the startup read"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit: every write is a single small upsert
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._states: Dict[str, JobState] = {
+            row[0]: JobState(row[0], row[1], bool(row[2]), *row[3:])
+            for row in self._conn.execute(SELECT_ALL)
+        }
+
+    def get(self, name: str) -> Optional[JobState]:
+        return self._states.get(name)
+
+    def record_scheduled(self, name: str, scheduled: float):
+        with self._lock:
+            self._state(name).last_scheduled = scheduled
+            self._conn.execute(UPSERT_SCHEDULED, (name, scheduled))
+
+    def set_paused(self, name: str, paused: bool):
+        with self._lock:
+            self._state(name).paused = paused
+            self._conn.execute(UPSERT_PAUSED, (name, int(paused)))
+
+    def record_run(self, record):
+        """Store how a run ended (an executor RunRecord)"""
+        with self._lock:
+            state = self._state(record.job)
+            state.last_started = record.started_at
+            state.last_finished = record.finished_at
+            state.last_outcome = record.outcome
+            state.last_error = record.error
+            self._conn.execute(UPSERT_RUN, (
+                record.job, record.started_at, record.finished_at, record.outcome, record.error
+            ))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _state(self, name: str) -> JobState:
+        state = self._states.get(name)
+        if state is None:
+            state = self._states[name] = JobState(name)
+        return state
@@ -1,17 +1,58 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+import orjson
+import os
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+
+from cache import LRUCache
+from metrics import MetricsMiddleware, RequestMetrics, render
+from store import (
+    BatchError, DuplicateUserError, InMemoryUserStore, UserNotFoundError, UserRecord,
+    VersionConflictError
+)
 
 app = FastAPI(
     title="User Service API",
     description="User management microservice for Multi-Everything DevOps",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# In-memory storage (replace with database later)
-users_db = []
+request_metrics = RequestMetrics()
+app.add_middleware(MetricsMiddleware, metrics=request_metrics)
+
+# Storage backend: "memory" (single process) or "sqlite" (shared by all workers)
+USER_STORE_BACKEND = os.environ.get("USER_STORE_BACKEND", "memory")
+USER_DB_PATH = os.environ.get("USER_DB_PATH", "users.db")
+USER_DB_POOL_SIZE = int(os.environ.get("USER_DB_POOL_SIZE", "8"))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "1000"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "1000"))
+
+def create_user_store():
+    if USER_STORE_BACKEND == "sqlite":
+        from sqlite_store import SQLiteUserStore
+        return SQLiteUserStore(USER_DB_PATH, pool_size=USER_DB_POOL_SIZE)
+    if USER_STORE_BACKEND == "memory":
+        return InMemoryUserStore()
+    raise ValueError(f"Unknown USER_STORE_BACKEND: {USER_STORE_BACKEND}")
+
+users_db = create_user_store()
+
+# Pre-serialized response bodies, keyed by user id / page and tagged with the
+# record or collection version they were rendered from
+user_cache = LRUCache(USER_CACHE_SIZE)
+page_cache = LRUCache(PAGE_CACHE_SIZE)
+
+async def store_call(method, *args, **kwargs):
+    """Call a store method, moving it to the threadpool when the backend blocks"""
+    if users_db.blocking:
+        return await run_in_threadpool(method, *args, **kwargs)
+    return method(*args, **kwargs)
 
 class User(BaseModel):
     id: str
@@ -20,6 +61,7 @@ class User(BaseModel):
     full_name: str
     created_at: datetime
     is_active: bool
+    version: int
 
 class UserCreate(BaseModel):
     email: str
@@ -32,6 +74,24 @@ class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     is_active: Optional[bool] = None
 
+class UserBatchUpdate(UserUpdate):
+    id: str
+
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+
+class BatchItemResult(BaseModel):
+    status: int
+    user: Optional[User] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+
+@app.on_event("shutdown")
+def close_user_store():
+    users_db.close()
+
 @app.get("/health")
 async def health_check():
     return {
@@ -40,20 +100,12 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
-@app.get("/users", response_model=List[User])
-async def get_users():
-    return users_db
+# Records produced by the store are already valid, so handlers return them
+# through ORJSONResponse directly instead of re-validating against the
+# response_model (which is kept for the OpenAPI schema only).
 
-@app.get("/users/{user_id}", response_model=User)
-async def get_user(user_id: str):
-    user = next((u for u in users_db if u["id"] == user_id), None)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
-
-@app.post("/users", response_model=User)
-async def create_user(user_data: UserCreate):
-    user = User(
+def _new_user(user_data: UserCreate) -> UserRecord:
+    return UserRecord(
         id=str(uuid.uuid4()),
         email=user_data.email,
         username=user_data.username,
@@ -61,21 +113,219 @@ async def create_user(user_data: UserCreate):
         created_at=datetime.utcnow(),
         is_active=True
     )
-    users_db.append(user.dict())
-    return user
+
+def _check_batch_size(items: list):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} items")
+
+def _batch_error_status(error: Exception) -> int:
+    return 404 if isinstance(error, UserNotFoundError) else 409
+
+def _failed_batch(size: int, batch_error: BatchError) -> ORJSONResponse:
+    """Per-item results for a rejected batch; items that did not fail were not applied"""
+    results = []
+    for index in range(size):
+        error = batch_error.errors.get(index)
+        if error is None:
+            results.append({"status": 424, "error": "Not applied: another item in the batch failed"})
+        else:
+            results.append({"status": _batch_error_status(error), "error": str(error)})
+    return ORJSONResponse({"results": results}, status_code=409)
+
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names the current version"""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def _expected_version(request: Request, user_id: str) -> Optional[int]:
+    """Version named by If-Match; None when the header is absent or '*'"""
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return None
+    try:
+        return int(header.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        # An ETag we never issued can never match the current version
+        raise HTTPException(status_code=409, detail=f"User '{user_id}' does not match If-Match {header}")
+
+def _json_body(body: bytes, etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, **(headers or {})}
+    )
+
+def _invalidate_users(user_ids: List[str]):
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    page_cache.clear()
+
+def _cache_samples(name: str, cache: LRUCache) -> list:
+    lookups = cache.hits + cache.misses
+    return [
+        (f"user_service_{name}_cache_hits_total", "counter", f"{name} cache hits", cache.hits),
+        (f"user_service_{name}_cache_misses_total", "counter", f"{name} cache misses", cache.misses),
+        (f"user_service_{name}_cache_hit_ratio", "gauge", f"{name} cache hit ratio",
+         cache.hits / lookups if lookups else 0.0),
+        (f"user_service_{name}_cache_entries", "gauge", f"{name} cache entries", len(cache)),
+    ]
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    store_size = await store_call(len, users_db)
+    samples = [
+        ("user_service_store_users", "gauge", "Users in the store", store_size),
+        *_cache_samples("user", user_cache),
+        *_cache_samples("page", page_cache),
+    ]
+    return PlainTextResponse(render(request_metrics, samples), media_type="text/plain; version=0.0.4")
+
+def _ndjson_lines(users):
+    """Serialize users one per line so exports never build the full response"""
+    for user in users:
+        yield orjson.dumps(user) + b"\n"
+
+@app.get("/users", response_model=List[User])
+async def get_users(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    if format == "ndjson":
+        # Stream the whole collection (from the cursor on) page by page
+        return StreamingResponse(
+            _ndjson_lines(users_db.iter_all(after=after)),
+            media_type="application/x-ndjson"
+        )
+
+    # Any write bumps the collection version, which doubles as the list ETag
+    version = await store_call(users_db.collection_version)
+    etag = _etag(version)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cached = page_cache.get((after, limit), version)
+    if cached is None:
+        users = await store_call(users_db.page, after=after, limit=limit)
+        next_cursor = users[-1].id if len(users) == limit else None
+        cached = (orjson.dumps(users), next_cursor)
+        page_cache.put((after, limit), version, cached)
+
+    body, next_cursor = cached
+    return _json_body(body, etag, {"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; normalize aware query bounds to match"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+@app.get("/users/search", response_model=List[User])
+async def search_users(
+    username_prefix: Optional[str] = None,
+    email_domain: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    users = await store_call(
+        users_db.search,
+        username_prefix=username_prefix,
+        email_domain=email_domain,
+        is_active=is_active,
+        created_after=_as_utc(created_after),
+        created_before=_as_utc(created_before),
+        limit=limit
+    )
+    return ORJSONResponse(users)
+
+@app.post("/users:batch", response_model=BatchResponse, status_code=201)
+async def create_users_batch(users_data: List[UserCreate]):
+    _check_batch_size(users_data)
+    users = [_new_user(user_data) for user_data in users_data]
+    try:
+        await store_call(users_db.add_many, users)
+    except BatchError as e:
+        return _failed_batch(len(users), e)
+    page_cache.clear()
+    return ORJSONResponse(
+        {"results": [{"status": 201, "user": user} for user in users]},
+        status_code=201
+    )
+
+@app.patch("/users:batch", response_model=BatchResponse)
+async def update_users_batch(updates: List[UserBatchUpdate]):
+    _check_batch_size(updates)
+    changes = [
+        (update.id, update.dict(exclude={"id"}, exclude_unset=True, exclude_none=True))
+        for update in updates
+    ]
+    try:
+        users = await store_call(users_db.update_many, changes)
+    except BatchError as e:
+        return _failed_batch(len(changes), e)
+    _invalidate_users([user_id for user_id, _ in changes])
+    return ORJSONResponse({"results": [{"status": 200, "user": user} for user in users]})
+
+@app.post("/users:batchGet", response_model=BatchResponse)
+async def get_users_batch(request: BatchGetRequest):
+    _check_batch_size(request.ids)
+    users = await store_call(users_db.get_many, request.ids)
+    return ORJSONResponse({"results": [
+        {"status": 200, "user": user} if user else {"status": 404, "error": "User not found"}
+        for user in users
+    ]})
+
+@app.get("/users/{user_id}", response_model=User)
+async def get_user(user_id: str, request: Request):
+    user = await store_call(users_db.get, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    etag = _etag(user.version)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body = user_cache.get(user_id, user.version)
+    if body is None:
+        body = orjson.dumps(user)
+        user_cache.put(user_id, user.version, body)
+    return _json_body(body, etag)
+
+@app.post("/users", response_model=User)
+async def create_user(user_data: UserCreate):
+    user = _new_user(user_data)
+    try:
+        await store_call(users_db.add, user)
+    except DuplicateUserError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    page_cache.clear()
+    return ORJSONResponse(user, headers={"ETag": _etag(user.version)})
 
 @app.put("/users/{user_id}", response_model=User)
-async def update_user(user_id: str, user_data: UserUpdate):
-    user_index = next((i for i, u in enumerate(users_db) if u["id"] == user_id), None)
-    if user_index is None:
+async def update_user(user_id: str, user_data: UserUpdate, request: Request):
+    update_data = user_data.dict(exclude_unset=True, exclude_none=True)
+    expected_version = _expected_version(request, user_id)
+    try:
+        user = await store_call(users_db.update, user_id, update_data, expected_version)
+    except VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"ETag": _etag(e.current)})
+    except DuplicateUserError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user = users_db[user_index]
-    update_data = user_data.dict(exclude_unset=True)
-    user.update(update_data)
-    users_db[user_index] = user
-    
-    return user
+    _invalidate_users([user_id])
+    return ORJSONResponse(user, headers={"ETag": _etag(user.version)})
 
 if __name__ == "__main__":
     import uvicorn
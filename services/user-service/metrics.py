@@ -0,0 +1,162 @@
+"""
+Prometheus-style metrics for the user service.
+
+Counters and histograms are plain Python integers updated from the event
+loop thread only, so recording a request needs no locks: one bisect into
+pre-computed bucket bounds and a handful of integer increments (well under
+a few microseconds). The /metrics endpoint renders them in the Prometheus
+text exposition format.
+"""
+
+import bisect
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from 0.5 ms to 10 s
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds observations <= bounds[i], the last one +Inf"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket (like histogram_quantile)"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+
+class RequestMetrics:
+    """Per-route request counters, latency histograms and the in-flight gauge"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram()
+        histogram.observe(seconds)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task overhead) that times each
+    HTTP request. The route label is the matched path template, e.g.
+    /users/{user_id}, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.in_flight -= 1
+            route = scope.get("route")
+            metrics.observe(
+                scope["method"], route.path if route is not None else "unmatched", status, elapsed
+            )
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def render(metrics: RequestMetrics, extra: Iterable[Tuple[str, str, str, float]] = ()) -> str:
+    """Render request metrics plus extra (name, type, help, value) samples as Prometheus text"""
+    lines: List[str] = []
+
+    lines.append("# HELP user_service_requests_total HTTP requests by route and status")
+    lines.append("# TYPE user_service_requests_total counter")
+    for (method, route, status), count in sorted(metrics.requests.items()):
+        lines.append(f"user_service_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines.append("# HELP user_service_request_duration_seconds HTTP request latency")
+    lines.append("# TYPE user_service_request_duration_seconds histogram")
+    for (method, route), histogram in sorted(metrics.latency.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+            cumulative += bucket_count
+            labels = _labels(method=method, route=route, le=_format_bound(bound))
+            lines.append(f"user_service_request_duration_seconds_bucket{labels} {cumulative}")
+        labels = _labels(method=method, route=route, le="+Inf")
+        lines.append(f"user_service_request_duration_seconds_bucket{labels} {histogram.count}")
+        labels = _labels(method=method, route=route)
+        lines.append(f"user_service_request_duration_seconds_sum{labels} {histogram.sum}")
+        lines.append(f"user_service_request_duration_seconds_count{labels} {histogram.count}")
+
+    lines.append("# HELP user_service_request_duration_quantile_seconds Latency quantiles estimated from the histogram")
+    lines.append("# TYPE user_service_request_duration_quantile_seconds gauge")
+    for (method, route), histogram in sorted(metrics.latency.items()):
+        for q in QUANTILES:
+            value = histogram.quantile(q)
+            if value is not None:
+                labels = _labels(method=method, route=route, quantile=q)
+                lines.append(f"user_service_request_duration_quantile_seconds{labels} {value}")
+
+    samples = [
+        ("user_service_requests_in_flight", "gauge", "HTTP requests currently being served", metrics.in_flight),
+        ("user_service_uptime_seconds", "gauge", "Seconds since the service started", time.time() - metrics.started),
+        *extra
+    ]
+    for name, metric_type, help_text, value in samples:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
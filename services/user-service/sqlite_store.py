@@ -0,0 +1,310 @@
+"""
+SQLite-backed user store.
+
+The database runs in WAL mode so several uvicorn workers can share one data
+file: readers never block the writer and each other. Connections are pooled
+and every query uses a fixed parameterized statement, which sqlite3 keeps
+prepared in its per-connection statement cache.
+"""
+
+import queue
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from store import (
+    BatchError, DuplicateUserError, UserNotFoundError, UserRecord, UserStore,
+    VersionConflictError, prefix_upper_bound
+)
+
+COLUMNS = "id, email, username, full_name, created_at, is_active, version"
+
+# Queries must repeat this exact expression for SQLite to use the index on it
+EMAIL_DOMAIN_EXPR = "lower(substr(email, instr(email, '@') + 1))"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL UNIQUE,
+    full_name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', 0);
+
+CREATE INDEX IF NOT EXISTS users_created_at ON users (created_at);
+CREATE INDEX IF NOT EXISTS users_email_domain ON users ({EMAIL_DOMAIN_EXPR});
+"""
+
+# Databases created before records carried a version
+ADD_VERSION_COLUMN = "ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+
+SELECT_BY_ID = f"SELECT {COLUMNS} FROM users WHERE id = ?"
+SELECT_BY_EMAIL = f"SELECT {COLUMNS} FROM users WHERE email = ?"
+SELECT_BY_USERNAME = f"SELECT {COLUMNS} FROM users WHERE username = ?"
+SELECT_FIRST_PAGE = f"SELECT {COLUMNS} FROM users ORDER BY id LIMIT ?"
+SELECT_PAGE = f"SELECT {COLUMNS} FROM users WHERE id > ? ORDER BY id LIMIT ?"
+INSERT_USER = f"INSERT INTO users ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+UPDATE_USER = (
+    "UPDATE users SET email = ?, username = ?, full_name = ?, is_active = ?, version = ? "
+    "WHERE id = ?"
+)
+COUNT_USERS = "SELECT COUNT(*) FROM users"
+SELECT_COLLECTION_VERSION = "SELECT value FROM store_meta WHERE key = 'version'"
+BUMP_COLLECTION_VERSION = "UPDATE store_meta SET value = value + 1 WHERE key = 'version'"
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by worker threads"""
+
+    def __init__(self, path: str, size: int = 8, timeout: float = 30.0):
+        self._pool = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._connect(path, timeout))
+
+    @staticmethod
+    def _connect(path: str, timeout: float) -> sqlite3.Connection:
+        # Autocommit mode; writes open explicit transactions
+        conn = sqlite3.connect(
+            path,
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=64
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Take a connection and hold the write lock until commit"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def _row_to_user(row) -> Optional[UserRecord]:
+    if row is None:
+        return None
+    user_id, email, username, full_name, created_at, is_active, version = row
+    return UserRecord(
+        user_id, email, username, full_name,
+        datetime.fromisoformat(created_at), bool(is_active), version
+    )
+
+
+def _duplicate_error(error: sqlite3.IntegrityError, values: dict) -> DuplicateUserError:
+    # Message looks like "UNIQUE constraint failed: users.email"
+    field = "email" if "users.email" in str(error) else "username"
+    return DuplicateUserError(field, values.get(field))
+
+
+class SQLiteUserStore(UserStore):
+    """User store persisted in a WAL-mode SQLite file"""
+
+    # Every call does file I/O, so the API runs it off the event loop
+    blocking = True
+
+    def __init__(self, path: str, pool_size: int = 8):
+        self._pool = ConnectionPool(path, size=pool_size)
+        with self._pool.connection() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+            if columns and "version" not in columns:
+                conn.execute(ADD_VERSION_COLUMN)
+            conn.executescript(SCHEMA)
+
+    def get(self, user_id: str) -> Optional[UserRecord]:
+        return self._fetch_one(SELECT_BY_ID, user_id)
+
+    def collection_version(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute(SELECT_COLLECTION_VERSION).fetchone()[0]
+
+    def get_by_email(self, email: str) -> Optional[UserRecord]:
+        return self._fetch_one(SELECT_BY_EMAIL, email)
+
+    def get_by_username(self, username: str) -> Optional[UserRecord]:
+        return self._fetch_one(SELECT_BY_USERNAME, username)
+
+    def page(self, after: Optional[str] = None, limit: int = 100) -> List[UserRecord]:
+        with self._pool.connection() as conn:
+            if after is None:
+                rows = conn.execute(SELECT_FIRST_PAGE, (limit,)).fetchall()
+            else:
+                rows = conn.execute(SELECT_PAGE, (after, limit)).fetchall()
+        return [_row_to_user(row) for row in rows]
+
+    def add(self, user: UserRecord) -> UserRecord:
+        try:
+            with self._pool.transaction() as conn:
+                self._insert(conn, user)
+                conn.execute(BUMP_COLLECTION_VERSION)
+        except sqlite3.IntegrityError as e:
+            raise _duplicate_error(e, user.to_dict())
+        return user
+
+    def update(
+        self, user_id: str, changes: dict, expected_version: Optional[int] = None
+    ) -> Optional[UserRecord]:
+        # The version check runs inside the write transaction, so it cannot
+        # race with another worker's update
+        try:
+            with self._pool.transaction() as conn:
+                user = self._update(conn, user_id, changes, expected_version)
+                if user is not None:
+                    conn.execute(BUMP_COLLECTION_VERSION)
+                return user
+        except sqlite3.IntegrityError as e:
+            raise _duplicate_error(e, changes)
+
+    def get_many(self, user_ids: List[str]) -> List[Optional[UserRecord]]:
+        with self._pool.connection() as conn:
+            return [
+                _row_to_user(conn.execute(SELECT_BY_ID, (user_id,)).fetchone())
+                for user_id in user_ids
+            ]
+
+    def add_many(self, users: List[UserRecord]) -> List[UserRecord]:
+        # One transaction for the whole batch; a failed INSERT only aborts
+        # its own statement, so every item is checked before rolling back
+        with self._pool.transaction() as conn:
+            errors = {}
+            for index, user in enumerate(users):
+                try:
+                    self._insert(conn, user)
+                except sqlite3.IntegrityError as e:
+                    errors[index] = _duplicate_error(e, user.to_dict())
+            if errors:
+                raise BatchError(errors)
+            conn.execute(BUMP_COLLECTION_VERSION)
+        return users
+
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[UserRecord]:
+        with self._pool.transaction() as conn:
+            errors = {}
+            results = []
+            for index, (user_id, changes) in enumerate(updates):
+                try:
+                    user = self._update(conn, user_id, changes)
+                except sqlite3.IntegrityError as e:
+                    errors[index] = _duplicate_error(e, changes)
+                    continue
+                if user is None:
+                    errors[index] = UserNotFoundError(user_id)
+                    continue
+                results.append(user)
+            if errors:
+                raise BatchError(errors)
+            conn.execute(BUMP_COLLECTION_VERSION)
+        return results
+
+    def search(
+        self,
+        username_prefix: Optional[str] = None,
+        email_domain: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[UserRecord]:
+        # Every filter is a range or equality on an indexed column/expression;
+        # the SQLite planner picks the most selective index
+        conditions, params = [], []
+        if username_prefix:
+            upper = prefix_upper_bound(username_prefix)
+            if upper is None:
+                conditions.append("username >= ?")
+                params.append(username_prefix)
+            else:
+                conditions.append("username >= ? AND username < ?")
+                params += [username_prefix, upper]
+        if email_domain:
+            conditions.append(f"{EMAIL_DOMAIN_EXPR} = ?")
+            params.append(email_domain.lower())
+        if is_active is not None:
+            conditions.append("is_active = ?")
+            params.append(int(is_active))
+        if created_after:
+            conditions.append("created_at >= ?")
+            params.append(created_after.isoformat())
+        if created_before:
+            conditions.append("created_at <= ?")
+            params.append(created_before.isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {COLUMNS} FROM users {where} LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [_row_to_user(row) for row in rows]
+
+    def __len__(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute(COUNT_USERS).fetchone()[0]
+
+    def close(self):
+        self._pool.close()
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, user: UserRecord):
+        conn.execute(INSERT_USER, (
+            user.id,
+            user.email,
+            user.username,
+            user.full_name,
+            user.created_at.isoformat(),
+            int(user.is_active),
+            user.version
+        ))
+
+    @staticmethod
+    def _update(
+        conn: sqlite3.Connection, user_id: str, changes: dict, expected_version: Optional[int] = None
+    ) -> Optional[UserRecord]:
+        user = _row_to_user(conn.execute(SELECT_BY_ID, (user_id,)).fetchone())
+        if user is None:
+            return None
+        if expected_version is not None and user.version != expected_version:
+            raise VersionConflictError(user_id, expected_version, user.version)
+        user = replace(user, **changes, version=user.version + 1)
+        conn.execute(UPDATE_USER, (
+            user.email,
+            user.username,
+            user.full_name,
+            int(user.is_active),
+            user.version,
+            user_id
+        ))
+        return user
+
+    def _fetch_one(self, sql: str, value: str) -> Optional[UserRecord]:
+        with self._pool.connection() as conn:
+            return _row_to_user(conn.execute(sql, (value,)).fetchone())
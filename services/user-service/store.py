@@ -0,0 +1,465 @@
+"""
+Storage layer for the user service.
+
+Endpoints talk to a UserStore instead of a raw list so the backend can be
+swapped (in-memory today, a persistent database later) without touching
+the API handlers.
+"""
+
+import bisect
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass(slots=True)
+class UserRecord:
+    """
+    Compact stored form of a user. Records are never mutated in place:
+    updates swap in a new record with `version` bumped, so a reader always
+    sees a consistent one and the version can serve as its ETag.
+    orjson serializes slotted dataclasses natively, so API responses are
+    encoded straight from the record without a pydantic round-trip.
+    """
+
+    id: str
+    email: str
+    username: str
+    full_name: str
+    created_at: datetime
+    is_active: bool
+    version: int = 1
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def domain_of(email: str) -> str:
+    return email.split("@", 1)[-1].lower()
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Smallest string greater than every string starting with `prefix`, or
+    None when there is none (the prefix is all U+10FFFF)
+    """
+    while prefix:
+        code_point = ord(prefix[-1])
+        if code_point < sys.maxunicode:
+            code_point += 1
+            # Surrogates cannot be encoded (e.g. as SQLite text); skip them
+            if 0xD800 <= code_point <= 0xDFFF:
+                code_point = 0xE000
+            return prefix[:-1] + chr(code_point)
+        # Every string starting with "...\U0010FFFF" sorts below the
+        # shorter prefix's bound
+        prefix = prefix[:-1]
+    return None
+
+
+class DuplicateUserError(Exception):
+    """Raised when an email or username is already taken"""
+
+    def __init__(self, field: str, value: str):
+        super().__init__(f"User with {field} '{value}' already exists")
+        self.field = field
+        self.value = value
+
+
+class UserNotFoundError(Exception):
+    """Raised when a batch references a user that does not exist"""
+
+    def __init__(self, user_id: str):
+        super().__init__(f"User '{user_id}' not found")
+        self.user_id = user_id
+
+
+class VersionConflictError(Exception):
+    """Raised when an update expected a different version than the stored one"""
+
+    def __init__(self, user_id: str, expected: int, current: int):
+        super().__init__(
+            f"User '{user_id}' is at version {current}, not the expected {expected}"
+        )
+        self.user_id = user_id
+        self.expected = expected
+        self.current = current
+
+
+class BatchError(Exception):
+    """
+    Raised when any item of a batch fails. Nothing from the batch has been
+    applied; `errors` maps the index of each failed item to its error.
+    """
+
+    def __init__(self, errors: Dict[int, Exception]):
+        super().__init__(f"{len(errors)} batch item(s) failed")
+        self.errors = errors
+
+
+class UserStore:
+    """Repository interface for user records"""
+
+    # Backends that do I/O set this so the API calls them off the event loop
+    blocking = False
+
+    def get(self, user_id: str) -> Optional[UserRecord]:
+        raise NotImplementedError
+
+    def collection_version(self) -> int:
+        """Counter bumped by every write; identifies the state of the whole collection"""
+        raise NotImplementedError
+
+    def get_by_email(self, email: str) -> Optional[UserRecord]:
+        raise NotImplementedError
+
+    def get_by_username(self, username: str) -> Optional[UserRecord]:
+        raise NotImplementedError
+
+    def page(self, after: Optional[str] = None, limit: int = 100) -> List[UserRecord]:
+        """Return up to `limit` users ordered by id, starting after the `after` cursor"""
+        raise NotImplementedError
+
+    def iter_all(self, after: Optional[str] = None, batch_size: int = 500) -> Iterator[UserRecord]:
+        """Yield every user in id order, fetching one page at a time"""
+        while True:
+            batch = self.page(after=after, limit=batch_size)
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1].id
+
+    def add(self, user: UserRecord) -> UserRecord:
+        raise NotImplementedError
+
+    def update(
+        self, user_id: str, changes: dict, expected_version: Optional[int] = None
+    ) -> Optional[UserRecord]:
+        """Apply changes; with `expected_version` set, raise VersionConflictError on mismatch"""
+        raise NotImplementedError
+
+    def get_many(self, user_ids: List[str]) -> List[Optional[UserRecord]]:
+        return [self.get(user_id) for user_id in user_ids]
+
+    def search(
+        self,
+        username_prefix: Optional[str] = None,
+        email_domain: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[UserRecord]:
+        """Return up to `limit` users matching every given filter (created range is inclusive)"""
+        raise NotImplementedError
+
+    def add_many(self, users: List[UserRecord]) -> List[UserRecord]:
+        """Insert all users or none of them (raises BatchError)"""
+        raise NotImplementedError
+
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[UserRecord]:
+        """Apply all (user_id, changes) pairs or none of them (raises BatchError)"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InMemoryUserStore(UserStore):
+    """
+    Dict-backed store with a primary index on id and unique secondary
+    indexes on email and username, so lookups and duplicate checks are O(1).
+    A sorted id list backs keyset pagination. Search uses a sorted username
+    list (prefix ranges), per-domain email buckets and a sorted created_at
+    list (time ranges), plus per-domain and per-is_active id sets, so
+    queries cost O(log n) plus the rows they touch.
+    """
+
+    def __init__(self, lock_stripes: int = 64):
+        self._users: Dict[str, UserRecord] = {}
+        self._sorted_ids: List[str] = []
+        self._by_email: Dict[str, str] = {}
+        self._by_username: Dict[str, str] = {}
+        self._sorted_usernames: List[str] = []
+        self._by_domain: Dict[str, Set[str]] = {}
+        self._by_active: Dict[bool, Set[str]] = {True: set(), False: set()}
+        self._sorted_created: List[Tuple[datetime, str]] = []
+        self._version = 0
+        # Writers lock the stripes covering the record id and every unique key
+        # they release or claim, so writes to unrelated users never wait on
+        # each other. The index lock only guards the short structural updates
+        # of the shared maps and sorted lists.
+        self._stripes = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        self._index_lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[UserRecord]:
+        return self._users.get(user_id)
+
+    def collection_version(self) -> int:
+        return self._version
+
+    def get_by_email(self, email: str) -> Optional[UserRecord]:
+        user_id = self._by_email.get(email)
+        return self._users.get(user_id) if user_id else None
+
+    def get_by_username(self, username: str) -> Optional[UserRecord]:
+        user_id = self._by_username.get(username)
+        return self._users.get(user_id) if user_id else None
+
+    def page(self, after: Optional[str] = None, limit: int = 100) -> List[UserRecord]:
+        ids = self._sorted_ids
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        return [self._users[user_id] for user_id in ids[start:start + limit]]
+
+    def add(self, user: UserRecord) -> UserRecord:
+        with self._locked(_lock_keys(user)):
+            self._check_unique(user.email, user.username)
+            with self._index_lock:
+                self._users[user.id] = user
+                bisect.insort(self._sorted_ids, user.id)
+                self._by_email[user.email] = user.id
+                self._by_username[user.username] = user.id
+                bisect.insort(self._sorted_usernames, user.username)
+                bisect.insort(self._sorted_created, (user.created_at, user.id))
+                self._by_domain.setdefault(domain_of(user.email), set()).add(user.id)
+                self._by_active[user.is_active].add(user.id)
+                self._version += 1
+        return user
+
+    def update(
+        self, user_id: str, changes: dict, expected_version: Optional[int] = None
+    ) -> Optional[UserRecord]:
+        while True:
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            if expected_version is not None and user.version != expected_version:
+                raise VersionConflictError(user_id, expected_version, user.version)
+
+            updated = replace(user, **changes, version=user.version + 1)
+            with self._locked(_lock_keys(user) + _lock_keys(updated)):
+                if self._users.get(user_id) is not user:
+                    # Another writer got in first; re-read and re-check the version
+                    continue
+                self._check_unique(updated.email, updated.username, exclude_id=user_id)
+
+                with self._index_lock:
+                    # Keep the secondary indexes in step with the record
+                    if updated.email != user.email:
+                        del self._by_email[user.email]
+                        self._by_email[updated.email] = user_id
+                    if updated.username != user.username:
+                        del self._by_username[user.username]
+                        self._by_username[updated.username] = user_id
+                    self._reindex_search(user, updated)
+
+                    self._users[user_id] = updated
+                    self._version += 1
+                return updated
+
+    def add_many(self, users: List[UserRecord]) -> List[UserRecord]:
+        with self._locked_all():
+            errors = {}
+            batch_emails = set()
+            batch_usernames = set()
+            for index, user in enumerate(users):
+                try:
+                    self._check_unique(user.email, user.username)
+                    if user.email in batch_emails:
+                        raise DuplicateUserError("email", user.email)
+                    if user.username in batch_usernames:
+                        raise DuplicateUserError("username", user.username)
+                except DuplicateUserError as e:
+                    errors[index] = e
+                    continue
+                batch_emails.add(user.email)
+                batch_usernames.add(user.username)
+            if errors:
+                raise BatchError(errors)
+
+            with self._index_lock:
+                for user in users:
+                    self._users[user.id] = user
+                    self._by_email[user.email] = user.id
+                    self._by_username[user.username] = user.id
+                    self._by_domain.setdefault(domain_of(user.email), set()).add(user.id)
+                    self._by_active[user.is_active].add(user.id)
+                # Timsort merges the appended run with the sorted prefix cheaply
+                self._sorted_ids.extend(user.id for user in users)
+                self._sorted_ids.sort()
+                self._sorted_usernames.extend(user.username for user in users)
+                self._sorted_usernames.sort()
+                self._sorted_created.extend((user.created_at, user.id) for user in users)
+                self._sorted_created.sort()
+                self._version += 1
+        return users
+
+    def update_many(self, updates: List[Tuple[str, dict]]) -> List[UserRecord]:
+        with self._locked_all():
+            errors = {}
+            # Stage every change first so a failure leaves the store untouched
+            staged: Dict[str, UserRecord] = {}
+            email_owner: Dict[str, Optional[str]] = {}
+            username_owner: Dict[str, Optional[str]] = {}
+            results = []
+            for index, (user_id, changes) in enumerate(updates):
+                current = staged.get(user_id) or self._users.get(user_id)
+                if current is None:
+                    errors[index] = UserNotFoundError(user_id)
+                    continue
+                user = replace(current, **changes, version=current.version + 1)
+                try:
+                    self._check_staged(email_owner, self._by_email, "email", user, current)
+                    self._check_staged(username_owner, self._by_username, "username", user, current)
+                except DuplicateUserError as e:
+                    errors[index] = e
+                    continue
+                staged[user_id] = user
+                results.append(user)
+            if errors:
+                raise BatchError(errors)
+
+            with self._index_lock:
+                for user_id, user in staged.items():
+                    old = self._users[user_id]
+                    if user.email != old.email:
+                        if self._by_email.get(old.email) == user_id:
+                            del self._by_email[old.email]
+                        self._by_email[user.email] = user_id
+                    if user.username != old.username:
+                        if self._by_username.get(old.username) == user_id:
+                            del self._by_username[old.username]
+                        self._by_username[user.username] = user_id
+                    self._reindex_search(old, user)
+                    self._users[user_id] = user
+                self._version += 1
+        return [staged[user.id] for user in results]
+
+    def search(
+        self,
+        username_prefix: Optional[str] = None,
+        email_domain: Optional[str] = None,
+        is_active: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[UserRecord]:
+        # Size each usable index range with bisect, then drive the query from
+        # the smallest one and check the remaining filters per row
+        candidates: List[Tuple[int, Callable[[], Iterable[str]]]] = []
+        if username_prefix:
+            names = self._sorted_usernames
+            lo = bisect.bisect_left(names, username_prefix)
+            upper = prefix_upper_bound(username_prefix)
+            hi = bisect.bisect_left(names, upper) if upper is not None else len(names)
+            # Walked lazily, so the scan stops once `limit` rows match; a
+            # username renamed away meanwhile has no owner and is skipped
+            candidates.append((hi - lo, lambda: (
+                self._by_username.get(names[i]) for i in range(lo, min(hi, len(names)))
+            )))
+        if email_domain:
+            bucket = self._by_domain.get(email_domain.lower(), set())
+            candidates.append((len(bucket), lambda: list(bucket)))
+        if is_active is not None:
+            active = self._by_active[is_active]
+            candidates.append((len(active), lambda: list(active)))
+            # When most users match, walking the ids until `limit` of them
+            # match is cheaper than copying the id set
+            total = len(self._sorted_ids)
+            candidates.append((min(total, limit * total // max(len(active), 1)), lambda: iter(self._sorted_ids)))
+        if created_after or created_before:
+            created = self._sorted_created
+            start = bisect.bisect_left(created, (created_after,)) if created_after else 0
+            end = bisect.bisect_right(created, (created_before, "\uffff")) if created_before else len(created)
+            candidates.append((max(end - start, 0), lambda: (user_id for _, user_id in created[start:end])))
+        if not candidates:
+            candidates.append((len(self._sorted_ids), lambda: self._sorted_ids))
+
+        _, user_ids = min(candidates, key=lambda candidate: candidate[0])
+        results = []
+        for user_id in user_ids():
+            user = self._users.get(user_id) if user_id is not None else None
+            if user is None or not _matches(
+                user, username_prefix, email_domain, is_active, created_after, created_before
+            ):
+                continue
+            results.append(user)
+            if len(results) >= limit:
+                break
+        return results
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @contextmanager
+    def _locked(self, keys: Iterable[Hashable]):
+        """Acquire the stripes covering `keys` in index order, so writers never deadlock"""
+        stripes = sorted({hash(key) % len(self._stripes) for key in keys})
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self._stripes[stripe].release()
+
+    def _locked_all(self):
+        return self._locked(range(len(self._stripes)))
+
+    def _reindex_search(self, old: UserRecord, new: UserRecord):
+        if new.username != old.username:
+            del self._sorted_usernames[bisect.bisect_left(self._sorted_usernames, old.username)]
+            bisect.insort(self._sorted_usernames, new.username)
+        old_domain, new_domain = domain_of(old.email), domain_of(new.email)
+        if new_domain != old_domain:
+            bucket = self._by_domain[old_domain]
+            bucket.discard(old.id)
+            if not bucket:
+                del self._by_domain[old_domain]
+            self._by_domain.setdefault(new_domain, set()).add(new.id)
+        if new.is_active != old.is_active:
+            self._by_active[old.is_active].discard(old.id)
+            self._by_active[new.is_active].add(new.id)
+
+    @staticmethod
+    def _check_staged(staged_owner, index, field, user, current):
+        """Check a unique field against the index plus changes staged earlier in the batch"""
+        value = getattr(user, field)
+        if value != getattr(current, field):
+            staged_owner[getattr(current, field)] = None
+        owner = staged_owner[value] if value in staged_owner else index.get(value)
+        if owner is not None and owner != user.id:
+            raise DuplicateUserError(field, value)
+        staged_owner[value] = user.id
+
+    def _check_unique(self, email: str, username: str, exclude_id: Optional[str] = None):
+        owner = self._by_email.get(email)
+        if owner is not None and owner != exclude_id:
+            raise DuplicateUserError("email", email)
+        owner = self._by_username.get(username)
+        if owner is not None and owner != exclude_id:
+            raise DuplicateUserError("username", username)
+
+
+def _lock_keys(user: UserRecord) -> Tuple[Hashable, ...]:
+    return (("id", user.id), ("email", user.email), ("username", user.username))
+
+
+def _matches(user, username_prefix, domain, is_active, created_after, created_before) -> bool:
+    if username_prefix and not user.username.startswith(username_prefix):
+        return False
+    if domain and domain_of(user.email) != domain.lower():
+        return False
+    if is_active is not None and user.is_active != is_active:
+        return False
+    if created_after and user.created_at < created_after:
+        return False
+    if created_before and user.created_at > created_before:
+        return False
+    return True
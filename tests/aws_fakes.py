@@ -0,0 +1,99 @@
+"""
+In-memory stand-ins for the AWS clients the image-processor Lambda uses,
+shared by the unit tests and tests/load/bench_image_processor.py. Each
+call can add a fixed latency, to model round trips in benchmarks.
+"""
+
+import io
+import threading
+import time
+
+
+class FakeStreamingBody(io.RawIOBase):
+    """Response body that, like a socket, hands out fresh copies of the data"""
+
+    def __init__(self, data):
+        self._data = memoryview(data)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self._data) - self._position)
+        buffer[:n] = self._data[self._position:self._position + n]
+        self._position += n
+        return n
+
+
+class FakeS3Client:
+    """In-memory S3 with a fixed latency per call"""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.objects = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.latency)
+
+    @staticmethod
+    def _check_metadata(metadata):
+        # As botocore does before sending the request
+        for name, value in metadata.items():
+            if not isinstance(name, str) or not isinstance(value, str):
+                raise AttributeError(f"Metadata {name!r} must map a string to a string, not {type(value).__name__}")
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call("put_object")
+        self._check_metadata(kwargs.get("Metadata", {}))
+        self.objects[(Bucket, Key)] = {"Body": bytes(Body), "Metadata": kwargs.get("Metadata", {})}
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call("get_object")
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        obj = self.objects[(Bucket, Key)]
+        return {"Body": FakeStreamingBody(obj["Body"]), "ContentLength": len(obj["Body"]), "Metadata": obj["Metadata"]}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call("head_object")
+        obj = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(obj["Body"]), "Metadata": obj["Metadata"]}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self._call("copy_object")
+        self._check_metadata(kwargs.get("Metadata", {}))
+        if (CopySource["Bucket"], CopySource["Key"]) not in self.objects:
+            raise self.exceptions.NoSuchKey(CopySource["Key"])
+        source = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+        metadata = kwargs["Metadata"] if kwargs.get("MetadataDirective") == "REPLACE" else source["Metadata"]
+        self.objects[(Bucket, Key)] = {"Body": source["Body"], "Metadata": metadata}
+        return {}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._call("delete_object")
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+
+class FakeRekognitionClient:
+    def __init__(self, latency, labels=()):
+        self.latency = latency
+        self.labels = list(labels)
+
+    def detect_moderation_labels(self, **kwargs):
+        time.sleep(self.latency)
+        return {"ModerationLabels": self.labels}
+
+
+def handler_event(bucket, keys):
+    return {"Records": [{"s3": {"bucket": {"name": bucket}, "object": {"key": key}}} for key in keys]}
@@ -0,0 +1,21 @@
+"""
+Puts the code under test on sys.path for tests/unit: the cron scheduler,
+the user service and the image-processor Lambda, plus this directory for
+the shared fakes (aws_fakes.py). The services share some module names
+(metrics.py), so tests only import modules unique to one of them.
+"""
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SCHEDULER_DIR = os.path.join(ROOT, "services", "cron-scheduler")
+USER_SERVICE_DIR = os.path.join(ROOT, "services", "user-service")
+IMAGE_PROCESSOR_DIR = os.path.join(ROOT, "lambdas", "image-processor")
+
+for path in (USER_SERVICE_DIR, IMAGE_PROCESSOR_DIR, SCHEDULER_DIR, os.path.dirname(os.path.abspath(__file__))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# boto3 clients are created when lambda_function is imported
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the image-processor Lambda's resize pipeline.
+
+Synthetic uploads (phone photo, panorama, PNG screenshot, small JPEG) are
+run through the Lambda's cascaded, draft-decoding pipeline
+(lambdas/image-processor/image_variants.py) and through the previous
+approach (full decode, then every size resized from the original with
+LANCZOS) and the CPU time per upload is compared. The PSNR of each new
+variant against the previous one is printed as a quality check. Results
+are printed as JSON; no AWS access is needed.
+
+    python tests/load/bench_image_processor.py --repeat 5
+
+With --handler, whole S3 events are run through lambda_handler against
+in-memory stand-ins for S3 and Rekognition that add a fixed latency per
+call, once with one record and one variant at a time and once with the
+Lambda's concurrency settings. This needs the Lambda's requirements
+(boto3) installed, but no AWS access:
+
+    python tests/load/bench_image_processor.py --handler --records 8 --latency-ms 40 --moderation-ms 300
+
+With --dedup, an event of unique uploads is followed by one of reposts of
+the same content, with the content-hash index off, in SQLite and in the
+fake S3. The reposts' cache hit rate and the time saved are reported:
+
+    python tests/load/bench_image_processor.py --dedup --records 8 --reposts 0.5
+
+With --memory, each upload is processed by lambda_handler in a fresh
+process, and the peak RSS before and after it is reported. This is the
+data for sizing the Lambda's memory setting:
+
+    python tests/load/bench_image_processor.py --memory
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "lambdas", "image-processor"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from aws_fakes import FakeRekognitionClient, FakeS3Client, handler_event  # noqa: E402
+from image_variants import SIZES, encode_jpeg, fit_size, render_variants  # noqa: E402
+
+UPLOADS = {
+    "photo_4032x3024.jpg": ((4032, 3024), "JPEG"),
+    "panorama_8000x3000.jpg": ((8000, 3000), "JPEG"),
+    "screenshot_2560x1600.png": ((2560, 1600), "PNG"),
+    "small_1024x768.jpg": ((1024, 768), "JPEG")
+}
+
+# Only measured with --memory
+LARGE_UPLOADS = {
+    "panorama_16000x4000.jpg": ((16000, 4000), "JPEG"),
+    "panorama_8000x4000.png": ((8000, 4000), "PNG")
+}
+
+
+def synthetic_image(size, fmt, seed=0):
+    """Gradient plus noise plus hard edges, roughly as hard to encode as a photo"""
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40 + seed)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, max(1, width // 40)):
+        draw.line([(i, 0), (width - i, height)], fill=(255, 255 - i % 256, i % 256), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=92)
+    return buffer.getvalue()
+
+
+def legacy_variants(data):
+    """The previous pipeline: full decode, every size from the original"""
+    image = Image.open(io.BytesIO(data))
+    variants = {}
+    for name, box in SIZES.items():
+        resized = image.resize(fit_size(image.size, box), Image.Resampling.LANCZOS)
+        if resized.mode not in ("RGB", "L"):
+            resized = resized.convert("RGB")
+        variants[name] = encode_jpeg(resized)
+    return image.size, variants
+
+
+def cascade_variants(data):
+    return render_variants(io.BytesIO(data))
+
+
+def psnr(a, b):
+    """dB; None for identical images"""
+    a = Image.open(io.BytesIO(a)).convert("RGB")
+    b = Image.open(io.BytesIO(b)).convert("RGB")
+    if a.size != b.size:
+        return None
+    mse = sum(v * v for v in ImageStat.Stat(ImageChops.difference(a, b)).rms) / 3
+    return round(10 * math.log10(255 * 255 / mse), 1) if mse else None
+
+
+def measure(pipeline, data, repeat):
+    cpu = []
+    wall = []
+    for _ in range(repeat):
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        _, variants = pipeline(data)
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+    return {
+        "cpu_ms": round(min(cpu) * 1000, 1),
+        "wall_ms": round(min(wall) * 1000, 1),
+        "output_kb": round(sum(len(v) for v in variants.values()) / 1024, 1)
+    }, variants
+
+
+def bench_handler(records, latency, moderation_latency, repeat):
+    """Wall time of lambda_handler per event, serial vs concurrent"""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    import lambda_function
+
+    data = synthetic_image(UPLOADS["photo_4032x3024.jpg"][0], "JPEG")
+    keys = [f"uploads/bench-{i}.jpg" for i in range(records)]
+    configurations = {
+        "serial": (1, 1),
+        "concurrent": (lambda_function.RECORD_CONCURRENCY, lambda_function.VARIANT_WORKERS)
+    }
+    results = {"records": records, "latency_ms": latency * 1000, "moderation_ms": moderation_latency * 1000}
+    for label, (record_concurrency, variant_workers) in configurations.items():
+        s3 = FakeS3Client(latency)
+        for key in keys:
+            s3.objects[("bench", key)] = {"Body": data, "Metadata": {}}
+        lambda_function.s3_client = s3
+        lambda_function.rekognition_client = FakeRekognitionClient(moderation_latency)
+        # Every record has the same content, which the dedup index would skip
+        lambda_function.variant_index = None
+        lambda_function.RECORD_CONCURRENCY = record_concurrency
+        lambda_function.variant_pool = ThreadPoolExecutor(max_workers=variant_workers)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = lambda_function.lambda_handler(handler_event("bench", keys), None)
+            timings.append(time.perf_counter() - start)
+            if response["statusCode"] != 200:
+                raise RuntimeError(f"lambda_handler failed: {response['body']}")
+        lambda_function.variant_pool.shutdown()
+        missing = [key for key in keys if ("bench", lambda_function.generate_processed_key(key, "thumbnail")) not in s3.objects]
+        if missing:
+            raise RuntimeError(f"Variants missing for {missing}")
+        results[label] = {
+            "record_concurrency": record_concurrency,
+            "variant_workers": variant_workers,
+            "event_ms": round(min(timings) * 1000, 1),
+            "calls_per_event": {name: count // repeat for name, count in sorted(s3.calls.items())}
+        }
+        print(f"{label}: {results[label]['event_ms']} ms per event", file=sys.stderr)
+    return results
+
+
+def peak_rss_mb():
+    # VmHWM rather than ru_maxrss, which a child inherits across exec from
+    # the (larger) benchmark process
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_dedup(records, reposts, latency, moderation_latency):
+    """One event of unique uploads and reposts, with and without the dedup index"""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    import lambda_function
+    from variant_cache import S3VariantIndex, SQLiteVariantIndex
+
+    unique = max(1, records - int(records * reposts))
+    originals = [synthetic_image(UPLOADS["photo_4032x3024.jpg"][0], "JPEG", seed=i) for i in range(unique)]
+    keys = [f"uploads/post-{i}.jpg" for i in range(records)]
+    results = {"records": records, "unique": unique}
+    with tempfile.TemporaryDirectory() as directory:
+        indexes = {
+            "off": lambda s3: None,
+            "sqlite": lambda s3: SQLiteVariantIndex(os.path.join(directory, "index.db")),
+            "s3": lambda s3: S3VariantIndex(s3)
+        }
+        for label, make_index in indexes.items():
+            s3 = FakeS3Client(latency)
+            for i, key in enumerate(keys):
+                s3.objects[("bench", key)] = {"Body": originals[i % unique], "Metadata": {}}
+            lambda_function.s3_client = s3
+            lambda_function.rekognition_client = FakeRekognitionClient(moderation_latency)
+            lambda_function.variant_index = make_index(s3)
+            # Originals first, then reposts, as two events
+            start = time.perf_counter()
+            first = lambda_function.lambda_handler(handler_event("bench", keys[:unique]), None)
+            second = lambda_function.lambda_handler(handler_event("bench", keys[unique:]), None) if records > unique else None
+            elapsed = time.perf_counter() - start
+            missing = [key for key in keys if ("bench", lambda_function.generate_processed_key(key, "thumbnail")) not in s3.objects]
+            if first["statusCode"] != 200 or (second and second["statusCode"] != 200) or missing:
+                raise RuntimeError(f"Dedup run '{label}' failed; variants missing for {missing}")
+            results[label] = {
+                "seconds": round(elapsed, 2),
+                "cache": json.loads(second["body"])["cache"] if second else None
+            }
+            print(f"{label}: {results[label]['seconds']}s", file=sys.stderr)
+    return results
+
+
+def memory_child(path):
+    """Run one upload through lambda_handler; prints peak RSS in MB as JSON"""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    import lambda_function
+
+    with open(path, "rb") as f:
+        data = f.read()
+    key = "uploads/" + os.path.basename(path)
+    s3 = FakeS3Client(0)
+    s3.objects[("bench", key)] = {"Body": data, "Metadata": {}}
+    lambda_function.s3_client = s3
+    lambda_function.rekognition_client = FakeRekognitionClient(0)
+    lambda_function.variant_index = None
+    del data
+    before = peak_rss_mb()
+    response = lambda_function.lambda_handler(handler_event("bench", [key]), None)
+    after = peak_rss_mb()
+    print(json.dumps({"status": response["statusCode"], "rss_before_mb": round(before), "peak_rss_mb": round(after)}))
+
+
+def bench_memory():
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (size, fmt) in {**UPLOADS, **LARGE_UPLOADS}.items():
+            path = os.path.join(directory, name)
+            with open(path, "wb") as f:
+                f.write(synthetic_image(size, fmt))
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--memory-child", path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[name] = {"input_kb": round(os.path.getsize(path) / 1024, 1), **json.loads(output.splitlines()[-1])}
+            results[name]["processing_mb"] = results[name]["peak_rss_mb"] - results[name]["rss_before_mb"]
+            print(f"{name}: +{results[name]['processing_mb']} MB", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per upload; the fastest is reported")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--handler", action="store_true", help="benchmark lambda_handler against fake AWS clients")
+    parser.add_argument("--records", type=int, default=8, help="records per event with --handler")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="fake S3 latency per call with --handler")
+    parser.add_argument("--moderation-ms", type=float, default=300.0, help="fake Rekognition latency with --handler")
+    parser.add_argument("--memory", action="store_true", help="peak RSS of lambda_handler per upload")
+    parser.add_argument("--dedup", action="store_true", help="reposts with and without the dedup index")
+    parser.add_argument("--reposts", type=float, default=0.5, help="share of records that are reposts with --dedup")
+    parser.add_argument("--memory-child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.memory_child:
+        memory_child(args.memory_child)
+        return
+    if args.memory or args.dedup:
+        if args.memory:
+            results = bench_memory()
+        else:
+            results = bench_dedup(args.records, args.reposts, args.latency_ms / 1000, args.moderation_ms / 1000)
+        print(json.dumps(results, indent=2))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return
+    if args.handler:
+        results = bench_handler(args.records, args.latency_ms / 1000, args.moderation_ms / 1000, args.repeat)
+        print(json.dumps(results, indent=2))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return
+
+    results = {
+        "python": platform.python_version(),
+        "pillow": Image.__version__,
+        "cpus": os.cpu_count(),
+        "uploads": {}
+    }
+    for name, (size, fmt) in UPLOADS.items():
+        data = synthetic_image(size, fmt)
+        legacy, legacy_out = measure(legacy_variants, data, args.repeat)
+        cascade, cascade_out = measure(cascade_variants, data, args.repeat)
+        results["uploads"][name] = {
+            "input_kb": round(len(data) / 1024, 1),
+            "legacy": legacy,
+            "cascade": cascade,
+            "cpu_saved_ms": round(legacy["cpu_ms"] - cascade["cpu_ms"], 1),
+            "speedup": round(legacy["cpu_ms"] / cascade["cpu_ms"], 2) if cascade["cpu_ms"] else None,
+            "psnr_db": {size_name: psnr(legacy_out[size_name], cascade_out[size_name]) for size_name in SIZES}
+        }
+        print(f"{name}: {legacy['cpu_ms']} ms -> {cascade['cpu_ms']} ms CPU", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
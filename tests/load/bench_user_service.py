@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Load-test and benchmark harness for the user-service API.
+
+Runs a mixed create/get/update/list workload against the FastAPI app from
+services/user-service/main.py, either in-process over ASGI (handler and
+serialization cost only) or over a local uvicorn server (adds the HTTP
+stack). The store is preloaded through POST /users:batch, then concurrent
+clients run for a fixed duration. Throughput and latency percentiles per
+operation are printed as JSON.
+
+Write results with --output and check a later run against them with
+--baseline; the script exits non-zero when throughput drops or p99 latency
+grows by more than --tolerance:
+
+    python tests/load/bench_user_service.py --users 100000 --output base.json
+    python tests/load/bench_user_service.py --users 100000 --baseline base.json
+
+Use --service-dir to benchmark another checkout of the service, e.g. a git
+worktree of the previous commit.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+DEFAULT_SERVICE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "services", "user-service"
+)
+
+OPERATIONS = ("create", "get", "update", "list")
+PRELOAD_BATCH = 1000
+
+
+def parse_mix(value):
+    """Parse "get=60,list=20" into normalized operation weights"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}'")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Workload:
+    """Issues one randomly chosen operation per call and records its latency"""
+
+    def __init__(self, client, user_ids, mix, seed):
+        self.client = client
+        self.user_ids = user_ids
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.created = 0
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+
+    async def step(self, worker_id):
+        name = self.rng.choices(self.names, self.weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await getattr(self, name)(worker_id)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            self.latencies[name].append(elapsed)
+        else:
+            self.errors[name] += 1
+
+    async def create(self, worker_id):
+        self.created += 1
+        suffix = f"w{worker_id}-{self.created}-{self.rng.getrandbits(32):x}"
+        response = await self.client.post("/users", json={
+            "email": f"{suffix}@bench.example.com",
+            "username": suffix,
+            "full_name": f"Bench {suffix}"
+        })
+        if response.status_code < 400:
+            self.user_ids.append(response.json()["id"])
+        return response
+
+    async def get(self, worker_id):
+        return await self.client.get(f"/users/{self.rng.choice(self.user_ids)}")
+
+    async def update(self, worker_id):
+        return await self.client.put(
+            f"/users/{self.rng.choice(self.user_ids)}",
+            json={"full_name": f"Updated {self.rng.getrandbits(32):x}"}
+        )
+
+    async def list(self, worker_id):
+        return await self.client.get("/users", params={"limit": 100, "after": self.rng.choice(self.user_ids)})
+
+
+async def preload(client, users):
+    user_ids = []
+    for start in range(0, users, PRELOAD_BATCH):
+        batch = [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "full_name": f"User {i}"}
+            for i in range(start, min(start + PRELOAD_BATCH, users))
+        ]
+        response = await client.post("/users:batch", json=batch)
+        response.raise_for_status()
+        user_ids.extend(item["user"]["id"] for item in response.json()["results"])
+    return user_ids
+
+
+async def drive(client, args):
+    user_ids = await preload(client, args.users)
+    workload = Workload(client, user_ids, args.mix, args.seed)
+
+    async def worker(worker_id, deadline):
+        while time.perf_counter() < deadline:
+            await workload.step(worker_id)
+
+    if args.warmup:
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(*(worker(i, deadline) for i in range(args.concurrency)))
+        workload.latencies = {name: [] for name in OPERATIONS}
+        workload.errors = {name: 0 for name in OPERATIONS}
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(worker(i, deadline) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    return summarize(workload, elapsed)
+
+
+def summarize(workload, elapsed):
+    results = {}
+    all_latencies = []
+    for name in OPERATIONS:
+        latencies = sorted(workload.latencies[name])
+        if not latencies and not workload.errors[name]:
+            continue
+        all_latencies.extend(latencies)
+        results[name] = _stats(latencies, workload.errors[name], elapsed)
+    results["total"] = _stats(sorted(all_latencies), sum(workload.errors.values()), elapsed)
+    return results
+
+
+def _stats(latencies, errors, elapsed):
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None)
+    }
+
+
+async def run_asgi(args):
+    sys.path.insert(0, os.path.abspath(args.service_dir))
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await drive(client, args)
+
+
+async def run_uvicorn(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=os.path.abspath(args.service_dir)
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not become healthy")
+            return await drive(client, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_revision(path):
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """List operations whose throughput or p99 regressed beyond the tolerance"""
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if previous["p99_ms"] and current["p99_ms"] and current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--service-dir", default=DEFAULT_SERVICE_DIR)
+    parser.add_argument("--users", type=int, default=1000, help="users preloaded before the run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured load first")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("get=60,list=20,update=15,create=5"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (needs a shared store)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    runner = run_uvicorn if args.mode == "uvicorn" else run_asgi
+    results = asyncio.run(runner(args))
+    report = {
+        "meta": {
+            "revision": git_revision(args.service_dir),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "store_backend": os.environ.get("USER_STORE_BACKEND", "memory"),
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else None,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix
+        },
+        "results": results
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
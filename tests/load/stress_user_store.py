@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Concurrent-writer stress test for the user-service stores.
+
+Each writer thread repeatedly picks a random user and increments a counter
+kept in full_name with an optimistic read-modify-write (update with
+expected_version, retry on VersionConflictError). Some writers also rename
+users to exercise the unique username index. At the end every increment
+must be accounted for and the indexes must agree with the records; the
+script exits non-zero otherwise.
+
+    python tests/load/stress_user_store.py --writers 16 --stripes 1 --stripes 64
+    python tests/load/stress_user_store.py --backend sqlite
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+SERVICE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "services", "user-service"
+)
+sys.path.insert(0, os.path.abspath(SERVICE_DIR))
+
+from store import DuplicateUserError, InMemoryUserStore, UserRecord, VersionConflictError  # noqa: E402
+
+
+def make_store(backend, stripes, tmpdir):
+    if backend == "sqlite":
+        from sqlite_store import SQLiteUserStore
+        return SQLiteUserStore(os.path.join(tmpdir, "stress.db"), pool_size=16)
+    return InMemoryUserStore(lock_stripes=stripes)
+
+
+def writer(store, user_ids, operations, seed, stats, lock):
+    rng = random.Random(seed)
+    increments = conflicts = renames = 0
+    for _ in range(operations):
+        user_id = rng.choice(user_ids)
+        if rng.random() < 0.1:
+            try:
+                store.update(user_id, {"username": f"renamed-{uuid.uuid4().hex[:12]}"})
+                renames += 1
+            except DuplicateUserError:
+                pass
+            continue
+        while True:
+            user = store.get(user_id)
+            try:
+                store.update(
+                    user_id, {"full_name": str(int(user.full_name) + 1)}, expected_version=user.version
+                )
+                increments += 1
+                break
+            except VersionConflictError:
+                conflicts += 1
+    with lock:
+        stats["increments"] += increments
+        stats["conflicts"] += conflicts
+        stats["renames"] += renames
+
+
+def run(backend, stripes, args, tmpdir):
+    store = make_store(backend, stripes, tmpdir)
+    users = [
+        UserRecord(str(uuid.uuid4()), f"user{i}@example.com", f"user{i}", "0", datetime.utcnow(), True)
+        for i in range(args.users)
+    ]
+    store.add_many(users)
+    user_ids = [user.id for user in users]
+
+    stats = {"increments": 0, "conflicts": 0, "renames": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=writer, args=(store, user_ids, args.operations, seed, stats, lock))
+        for seed in range(args.writers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    final = store.get_many(user_ids)
+    counted = sum(int(user.full_name) for user in final)
+    indexes_consistent = all(store.get_by_username(user.username).id == user.id for user in final)
+    store.close()
+    return {
+        "backend": backend,
+        "stripes": stripes if backend == "memory" else None,
+        "writers": args.writers,
+        "operations": args.writers * args.operations,
+        "elapsed_s": round(elapsed, 3),
+        "ops_per_s": round(args.writers * args.operations / elapsed, 1),
+        **stats,
+        "lost_updates": stats["increments"] - counted,
+        "indexes_consistent": indexes_consistent
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--stripes", type=int, action="append", help="lock stripes (repeatable)")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--operations", type=int, default=2000, help="operations per writer")
+    args = parser.parse_args()
+
+    # Switch threads as often as possible so writers really interleave
+    sys.setswitchinterval(1e-6)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for stripes in args.stripes or [64]:
+            results.append(run(args.backend, stripes, args, tmpdir))
+            if args.backend == "sqlite":
+                break
+    print(json.dumps(results, indent=2))
+
+    if any(r["lost_updates"] or not r["indexes_consistent"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Tests for the deduplicating backup pipeline against LocalStorage.
+
+    python -m pytest tests/unit/test_backup_pipeline.py
+"""
+
+import io
+
+import pytest
+
+
+from backup_pipeline import (
+    BackupIntegrityError, LocalStorage, backup, list_manifests, load_manifest, prune, restore
+)
+from compression import compress_bytes
+
+
+def make_dump(rows, changed_row=None):
+    lines = [
+        f"INSERT INTO users VALUES ({i}, 'user{i}@example.com', 'changed');\n" if i == changed_row
+        else f"INSERT INTO users VALUES ({i}, 'user{i}@example.com', 'active');\n"
+        for i in range(rows)
+    ]
+    return "".join(lines).encode()
+
+
+def source_of(data):
+    def dump(sink):
+        for start in range(0, len(data), 64 * 1024):
+            sink.write(data[start:start + 64 * 1024])
+    return dump
+
+
+def restored(storage, key):
+    out = io.BytesIO()
+    restore(storage, key, out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path / "backups"))
+
+
+def test_round_trip(storage):
+    data = make_dump(100_000)
+    manifest = backup(source_of(data), storage, "db", workers=2)
+    assert manifest["stats"]["chunks"] > 1
+    assert list_manifests(storage, "db") == [manifest["key"]]
+    assert restored(storage, manifest["key"]) == data
+
+
+def test_unchanged_chunks_are_not_stored_again(storage):
+    first = backup(source_of(make_dump(100_000)), storage, "db", workers=2)
+    assert first["stats"]["new_chunks"] == first["stats"]["chunks"]
+
+    changed = make_dump(100_000, changed_row=50_000)
+    second = backup(source_of(changed), storage, "db", workers=2)
+    # Content-defined boundaries: only the chunk holding the change is new
+    assert second["stats"]["new_chunks"] == 1
+    assert restored(storage, second["key"]) == changed
+
+
+def test_corrupted_chunk_fails_restore(storage):
+    manifest = backup(source_of(make_dump(100_000)), storage, "db", workers=2)
+    entry = manifest["chunks"][1]
+    storage.put(entry["key"], compress_bytes(b"x" * entry["size"], manifest["codec"], 1))
+    with pytest.raises(BackupIntegrityError):
+        restored(storage, manifest["key"])
+
+
+def test_prune_keeps_newest_and_their_chunks(storage):
+    old = backup(source_of(make_dump(100_000)), storage, "db", workers=2)
+    new = backup(source_of(make_dump(100_000, changed_row=50_000)), storage, "db", workers=2)
+    other = backup(source_of(b"other backup\n"), storage, "other", workers=2)
+
+    assert prune(storage, "db", keep=1) == 1
+    assert list_manifests(storage, "db") == [new["key"]]
+    assert list_manifests(storage, "other") == [other["key"]]
+    assert old["key"] not in list_manifests(storage)
+    remaining = set(storage.list("chunks"))
+    for key in (new["key"], other["key"]):
+        assert {entry["key"] for entry in load_manifest(storage, key)["chunks"]} <= remaining
+    assert restored(storage, new["key"]) == make_dump(100_000, changed_row=50_000)
@@ -0,0 +1,61 @@
+"""
+Tests for the cron scheduler's job executor.
+
+    python -m pytest tests/unit/test_executor.py
+"""
+
+import sys
+import threading
+
+import pytest
+
+
+from executor import JobExecutor, JobSpec
+
+
+def test_recent_runs_while_jobs_start_and_finish():
+    executor = JobExecutor(max_threads=8, history_size=10_000)
+    # Runs over the limit are recorded as skipped, so every submit adds a record
+    executor.register(JobSpec("tick", lambda: None, max_concurrency=8))
+    errors = []
+    stop = threading.Event()
+
+    def read_runs():
+        while not stop.is_set():
+            try:
+                executor.recent_runs(limit=10_000)
+                executor.recent_runs("tick", limit=10_000)
+            except Exception as e:  # noqa: BLE001 - any error fails the test
+                errors.append(e)
+
+    readers = [threading.Thread(target=read_runs) for _ in range(2)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(5000):
+            executor.submit("tick")
+    finally:
+        executor.shutdown(wait=True)
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert errors == []
+    assert len(executor.recent_runs("tick", limit=10_000)) == 5000
+
+
+@pytest.mark.parametrize("script", ["backup_task.py", "log_rotation.py"])
+def test_failed_crontab_script_is_recorded_as_failed(script, tmp_path, monkeypatch):
+    # backup_task fails without BACKUP_SOURCE; log_rotation fails on an unknown mode
+    monkeypatch.delenv("BACKUP_SOURCE", raising=False)
+    monkeypatch.setenv("BACKUP_TARGET_DIR", str(tmp_path))
+    monkeypatch.setenv("LOG_ROTATION_FILES", str(tmp_path / "cron.log"))
+    monkeypatch.setenv("LOG_ROTATION_LOCK", str(tmp_path / "rotation.lock"))
+    monkeypatch.setenv("LOG_ROTATION_MODE", "unknown")
+    monkeypatch.setenv("LOG_ROTATION_DIR", str(tmp_path))
+    monkeypatch.setenv("CLEANUP_DRY_RUN", "1")
+    name = script[:-len(".py")]
+    executor = JobExecutor()
+    executor.register(JobSpec(name, f"{sys.executable} {script} > /dev/null 2>&1", backend="command", timeout=60))
+    executor.submit(name)
+    executor.shutdown(wait=True)
+    assert executor.last_run(name).outcome == "failed"
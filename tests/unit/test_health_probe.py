@@ -0,0 +1,50 @@
+"""
+Tests for the cron scheduler's concurrent health prober.
+
+    python -m pytest tests/unit/test_health_probe.py
+"""
+
+import threading
+
+
+from health_probe import HealthProber
+
+
+def test_bad_target_does_not_abort_the_round():
+    prober = HealthProber({
+        # httpx.InvalidURL, which is not an httpx.HTTPError
+        "bad-url": "http://\x00host/health",
+        "no-scheme": "not a url",
+        "refused": "http://127.0.0.1:1/health"
+    }, timeout=2.0)
+    try:
+        results = {result.service: result for result in prober.probe()}
+    finally:
+        prober.close()
+    assert set(results) == {"bad-url", "no-scheme", "refused"}
+    assert all(not result.healthy and result.error for result in results.values())
+
+
+def test_summary_while_probing():
+    prober = HealthProber({"refused": "http://127.0.0.1:1/health"}, timeout=1.0, history_size=5)
+    errors = []
+    stop = threading.Event()
+
+    def read_summary():
+        while not stop.is_set():
+            try:
+                prober.summary()
+            except Exception as e:  # noqa: BLE001 - any error fails the test
+                errors.append(e)
+
+    reader = threading.Thread(target=read_summary)
+    reader.start()
+    try:
+        for _ in range(20):
+            prober.probe()
+    finally:
+        stop.set()
+        reader.join()
+        prober.close()
+    assert errors == []
+    assert prober.summary()["refused"]["samples"] == 5
@@ -0,0 +1,250 @@
+"""
+Tests for the image-processor Lambda against in-memory S3 and Rekognition
+(tests/aws_fakes.py). Needs the Lambda's requirements (boto3, Pillow) but
+no AWS access.
+
+    python -m pytest tests/unit/test_image_processor.py
+"""
+
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+from PIL import Image
+
+from aws_fakes import FakeRekognitionClient, FakeS3Client, handler_event
+import lambda_function
+from image_variants import SIZES
+from variant_cache import DEFAULT_PREFIX, S3VariantIndex, SQLiteVariantIndex
+
+BUCKET = "uploads-bucket"
+
+
+class FailingPutS3Client(FakeS3Client):
+    """Fails every put_object to the given keys"""
+
+    def __init__(self, failing_keys):
+        super().__init__(0)
+        self.failing_keys = set(failing_keys)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if Key in self.failing_keys:
+            raise RuntimeError(f"put_object failed for {Key}")
+        return super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kwargs)
+
+
+class FailingIndexS3Client(FakeS3Client):
+    """Every read and write of a variant index entry fails"""
+
+    def __init__(self, error):
+        super().__init__(0)
+        self.error = error
+        self.index_calls = 0
+
+    def _check(self, Key):
+        if Key.startswith(DEFAULT_PREFIX):
+            self.index_calls += 1
+            raise self.error
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._check(Key)
+        return super().get_object(Bucket=Bucket, Key=Key, **kwargs)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._check(Key)
+        return super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kwargs)
+
+
+class CountingRekognitionClient(FakeRekognitionClient):
+    def __init__(self):
+        super().__init__(0)
+        self.calls = 0
+
+    def detect_moderation_labels(self, **kwargs):
+        self.calls += 1
+        return super().detect_moderation_labels(**kwargs)
+
+
+class FailingRekognitionClient(FakeRekognitionClient):
+    def __init__(self):
+        super().__init__(0)
+
+    def detect_moderation_labels(self, **kwargs):
+        raise RuntimeError("Rekognition is unavailable")
+
+
+class RecordingBudget(lambda_function.StagingBudget):
+    """Remembers the most bytes ever reserved at once"""
+
+    def __init__(self, limit):
+        super().__init__(limit)
+        self.peak = 0
+
+    def try_reserve(self, size):
+        reserved = super().try_reserve(size)
+        self.peak = max(self.peak, self.used)
+        return reserved
+
+    def reserve(self, size):
+        super().reserve(size)
+        self.peak = max(self.peak, self.used)
+
+
+@pytest.fixture(scope="module")
+def image_data():
+    buffer = io.BytesIO()
+    Image.effect_noise((1024, 768), 40).convert("RGB").save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def run(monkeypatch, s3, keys, index=None, rekognition=None):
+    monkeypatch.setattr(lambda_function, "s3_client", s3)
+    monkeypatch.setattr(lambda_function, "rekognition_client", rekognition or FakeRekognitionClient(0))
+    monkeypatch.setattr(lambda_function, "variant_index", index)
+    return lambda_function.lambda_handler(handler_event(BUCKET, keys), None)
+
+
+def variant_keys(key):
+    return {lambda_function.generate_processed_key(key, size_name) for size_name in SIZES}
+
+
+def test_every_variant_is_uploaded(monkeypatch, image_data):
+    s3 = FakeS3Client(0)
+    keys = [f"uploads/photo-{i}.jpg" for i in range(6)]
+    for key in keys:
+        s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+
+    response = run(monkeypatch, s3, keys)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["processed_count"] == len(keys)
+    for key in keys:
+        assert variant_keys(key) <= {object_key for _, object_key in s3.objects}
+        assert s3.objects[(BUCKET, key)]["Metadata"]["moderation_status"] == "approved"
+
+
+def test_failed_record_does_not_stop_the_others(monkeypatch, image_data):
+    s3 = FakeS3Client(0)
+    good = [f"uploads/photo-{i}.jpg" for i in range(4)]
+    for key in good:
+        s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+    s3.objects[(BUCKET, "uploads/broken.jpg")] = {"Body": b"not an image", "Metadata": {}}
+
+    response = run(monkeypatch, s3, good[:2] + ["uploads/missing.jpg", "uploads/broken.jpg"] + good[2:])
+
+    # The response reports the failure, but every other record was still
+    # processed
+    assert response["statusCode"] == 500
+    uploaded = {object_key for _, object_key in s3.objects}
+    for key in good:
+        assert variant_keys(key) <= uploaded
+    assert not variant_keys("uploads/broken.jpg") & uploaded
+
+
+def test_failed_upload_is_reported(monkeypatch, image_data):
+    key = "uploads/photo.jpg"
+    failing = lambda_function.generate_processed_key(key, next(iter(SIZES)))
+    s3 = FailingPutS3Client([failing])
+    s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+
+    response = run(monkeypatch, s3, [key])
+
+    assert response["statusCode"] == 500
+    assert failing in json.loads(response["body"])["message"]
+    # Not marked processed, so a re-run does the whole image again
+    assert "processed" not in s3.objects[(BUCKET, key)]["Metadata"]
+
+
+def test_moderation_unavailable_is_marked_unverified(monkeypatch, image_data):
+    monkeypatch.setattr(lambda_function, "MODERATION_FAILURE_POLICY", "approve")
+    key = "uploads/photo.jpg"
+    s3 = FakeS3Client(0)
+    s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+
+    response = run(monkeypatch, s3, [key], rekognition=FailingRekognitionClient())
+
+    assert response["statusCode"] == 200
+    metadata = s3.objects[(BUCKET, key)]["Metadata"]
+    assert metadata["moderation_status"] == "unverified"
+    assert metadata["processed_versions"] == ",".join(SIZES)
+
+
+def test_moderation_unavailable_fails_the_invocation(monkeypatch, image_data):
+    monkeypatch.setattr(lambda_function, "MODERATION_FAILURE_POLICY", "fail")
+    s3 = FakeS3Client(0)
+    s3.objects[(BUCKET, "uploads/broken.jpg")] = {"Body": b"not an image", "Metadata": {}}
+    s3.objects[(BUCKET, "uploads/photo.jpg")] = {"Body": image_data, "Metadata": {}}
+
+    # Raised, not returned as a 500, so Lambda retries the invocation; an
+    # earlier record's other failure does not hide it
+    with pytest.raises(lambda_function.ModerationUnavailable):
+        run(monkeypatch, s3, ["uploads/broken.jpg", "uploads/photo.jpg"], rekognition=FailingRekognitionClient())
+    assert not variant_keys("uploads/photo.jpg") & {object_key for _, object_key in s3.objects}
+
+
+@pytest.mark.parametrize("error", [
+    ClientError({"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "GetObject"),
+    ConnectionError("connection reset")
+], ids=["client-error", "other-error"])
+def test_variant_index_errors_are_misses(monkeypatch, image_data, error):
+    key = "uploads/photo.jpg"
+    s3 = FailingIndexS3Client(error)
+    s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+
+    response = run(monkeypatch, s3, [key], index=S3VariantIndex(s3))
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["cache"]["misses"] == 1
+    # Both the lookup and the write were attempted
+    assert s3.index_calls == 2
+    assert variant_keys(key) <= {object_key for _, object_key in s3.objects}
+
+
+def test_repost_reuses_moderation_verdict(monkeypatch, image_data, tmp_path):
+    s3 = FakeS3Client(0)
+    for key in ("uploads/photo.jpg", "uploads/repost.jpg"):
+        s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+    index = SQLiteVariantIndex(str(tmp_path / "index.db"))
+    rekognition = CountingRekognitionClient()
+
+    first = run(monkeypatch, s3, ["uploads/photo.jpg"], index=index, rekognition=rekognition)
+    second = run(monkeypatch, s3, ["uploads/repost.jpg"], index=index, rekognition=rekognition)
+    index.close()
+
+    assert first["statusCode"] == second["statusCode"] == 200
+    assert json.loads(second["body"])["cache"]["hits"] == 1
+    assert rekognition.calls == 1
+    assert variant_keys("uploads/repost.jpg") <= {object_key for _, object_key in s3.objects}
+    assert s3.objects[(BUCKET, "uploads/repost.jpg")]["Metadata"]["moderation_status"] == "approved"
+
+
+def test_tmp_staging_stays_within_budget(monkeypatch, image_data):
+    # Every original goes through /tmp, and only one fits at a time
+    monkeypatch.setattr(lambda_function, "IN_MEMORY_MAX_BYTES", 0)
+    budget = RecordingBudget(len(image_data) * 3 // 2)
+    monkeypatch.setattr(lambda_function, "staging_budget", budget)
+    s3 = FakeS3Client(0.01)
+    keys = [f"uploads/photo-{i}.jpg" for i in range(4)]
+    for key in keys:
+        s3.objects[(BUCKET, key)] = {"Body": image_data, "Metadata": {}}
+
+    response = run(monkeypatch, s3, keys)
+
+    assert response["statusCode"] == 200
+    assert budget.peak == len(image_data)
+    assert budget.used == 0
+    for key in keys:
+        assert variant_keys(key) <= {object_key for _, object_key in s3.objects}
+
+
+def test_original_larger_than_tmp_budget_is_refused(monkeypatch, image_data):
+    monkeypatch.setattr(lambda_function, "IN_MEMORY_MAX_BYTES", 0)
+    monkeypatch.setattr(lambda_function, "staging_budget", lambda_function.StagingBudget(len(image_data) - 1))
+    s3 = FakeS3Client(0)
+    s3.objects[(BUCKET, "uploads/photo.jpg")] = {"Body": image_data, "Metadata": {}}
+
+    response = run(monkeypatch, s3, ["uploads/photo.jpg"])
+
+    assert response["statusCode"] == 500
+    assert "/tmp limit" in json.loads(response["body"])["message"]
@@ -0,0 +1,65 @@
+"""
+Tests for rename-mode log rotation in the cron scheduler.
+
+    python -m pytest tests/unit/test_log_rotation.py
+"""
+
+import gzip
+import os
+import threading
+
+import pytest
+
+
+import log_rotation
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    path = tmp_path / "cron.log"
+    path.write_text("before rotation\n")
+    monkeypatch.setenv("LOG_ROTATION_FILES", str(path))
+    monkeypatch.setenv("LOG_ROTATION_LOCK", str(tmp_path / "rotation.lock"))
+    # Every rotation ends with cleanup_old_rotated_logs, which must never
+    # reach the host's /var/log; none of these tests check the cleanup
+    monkeypatch.setenv("LOG_ROTATION_DIR", str(tmp_path))
+    monkeypatch.setenv("CLEANUP_DRY_RUN", "1")
+    monkeypatch.setenv("LOG_ROTATION_REOPEN_GRACE", "0")
+    monkeypatch.setenv("LOG_ROTATION_MODE", "rename")
+    monkeypatch.delenv("LOG_ROTATION_DELAYCOMPRESS", raising=False)
+    monkeypatch.delenv("LOG_ROTATION_POSTROTATE", raising=False)
+    return path
+
+
+def test_writer_that_never_reopens_keeps_its_lines(log_file):
+    # Like the crontab's ">> /var/log/cron.log": the descriptor outlives the rename
+    with open(log_file, "a") as writer:
+        assert log_rotation.rotate_logs()
+        writer.write("after rotation\n")
+    (staged,) = log_rotation._staged_files(str(log_file))
+
+    log_file.write_text("next day\n")
+    os.utime(staged, (0, 0))
+    assert log_rotation.rotate_logs()
+
+    assert log_rotation._staged_files(str(log_file)) != [staged]
+    with gzip.open(staged + ".gz", "rt") as rotated:
+        assert rotated.read() == "before rotation\nafter rotation\n"
+
+
+def test_concurrent_rotations_rename_once(log_file):
+    barrier = threading.Barrier(4)
+    results = []
+
+    def rotate():
+        barrier.wait()
+        results.append(log_rotation.rotate_logs(min_bytes=1))
+
+    threads = [threading.Thread(target=rotate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 4
+    # Later rotations may compress the first one's file, but never rename again
+    assert len(list(log_file.parent.glob("cron.log.*"))) == 1
@@ -0,0 +1,69 @@
+"""
+Tests for catch-up deadlines and lease claims across cron-scheduler replicas.
+
+    python -m pytest tests/unit/test_scheduler_replicas.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+
+import leases
+from engine import MAX_CATCH_UP, CronTrigger, IntervalTrigger, ScheduledJob, Scheduler
+
+SCHEDULER_DIR = os.path.dirname(os.path.abspath(leases.__file__))
+
+REPLICAS = 4
+DEADLINES = 200
+
+# One replica: claims every deadline of one job, printing the ones it won
+REPLICA_SCRIPT = textwrap.dedent("""
+    import json, sys
+    sys.path.insert(0, sys.argv[1])
+    from leases import ReplicaCoordinator, SQLiteLeaseStore
+    coordinator = ReplicaCoordinator(SQLiteLeaseStore(sys.argv[2]), replica_id=sys.argv[3])
+    won = [deadline for deadline in range({deadlines}) if coordinator.claim("backup", float(deadline))]
+    coordinator.close()
+    print(json.dumps(won))
+""").format(deadlines=DEADLINES)
+
+
+@pytest.mark.parametrize("trigger", [IntervalTrigger(60), CronTrigger("*/5 * * * *")], ids=repr)
+def test_long_outage_resumes_from_a_real_deadline(trigger):
+    start = trigger.next_after(1_700_000_000)
+    deadlines = [start]
+    for _ in range(MAX_CATCH_UP * 3):
+        deadlines.append(trigger.next_after(deadlines[-1]))
+
+    # Replicas noticing the outage at different moments between the same
+    # two deadlines must resume from the same one
+    resumed = set()
+    for offset in (0.5, 7.25, 59.0):
+        now = deadlines[-2] + offset
+        job = ScheduledJob("backup", trigger, lambda: None, "run_once", True, start)
+        runs, last_deadline = Scheduler._runs_due(job, now)
+        assert runs == 1
+        resumed.add(last_deadline)
+    assert resumed == {deadlines[-2]}
+
+
+def test_each_deadline_is_claimed_by_exactly_one_replica(tmp_path):
+    lease_db = str(tmp_path / "leases.db")
+    replicas = [
+        subprocess.Popen(
+            [sys.executable, "-c", REPLICA_SCRIPT, SCHEDULER_DIR, lease_db, f"replica-{i}"],
+            stdout=subprocess.PIPE, text=True
+        )
+        for i in range(REPLICAS)
+    ]
+    claimed = []
+    for replica in replicas:
+        output, _ = replica.communicate(timeout=60)
+        assert replica.returncode == 0
+        claimed.extend(json.loads(output))
+    assert sorted(claimed) == list(range(DEADLINES))
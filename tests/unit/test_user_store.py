@@ -0,0 +1,94 @@
+"""
+Search tests for the user-service stores (in-memory and SQLite).
+
+    python -m pytest tests/unit/test_user_store.py
+"""
+
+import sys
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+
+from sqlite_store import SQLiteUserStore
+from store import InMemoryUserStore, UserRecord, prefix_upper_bound
+
+MAX_CHAR = chr(sys.maxunicode)
+
+
+def make_user(username, is_active=True):
+    return UserRecord(str(uuid.uuid4()), f"{username}@example.com", username, username, datetime.utcnow(), is_active)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteUserStore(str(tmp_path / "users.db"))
+    else:
+        store = InMemoryUserStore()
+    yield store
+    store.close()
+
+
+def test_prefix_upper_bound():
+    assert prefix_upper_bound("ab") == "ac"
+    assert prefix_upper_bound("a" + MAX_CHAR) == "b"
+    assert prefix_upper_bound(MAX_CHAR * 2) is None
+    # The next code point after U+D7FF is a surrogate, which is skipped
+    assert prefix_upper_bound("a\ud7ff") == "a\ue000"
+
+
+def test_search_prefix_ending_in_max_code_point(store):
+    store.add_many([make_user("a" + MAX_CHAR), make_user("a" + MAX_CHAR + "x"), make_user("b")])
+    found = {user.username for user in store.search(username_prefix="a" + MAX_CHAR)}
+    assert found == {"a" + MAX_CHAR, "a" + MAX_CHAR + "x"}
+    assert store.search(username_prefix=MAX_CHAR) == []
+
+
+def test_search_prefix_stops_at_limit(store):
+    store.add_many([make_user(f"user{i:03}") for i in range(50)] + [make_user("other")])
+    found = store.search(username_prefix="user", limit=5)
+    assert len(found) == 5
+    assert all(user.username.startswith("user") for user in found)
+
+
+def test_search_is_active(store):
+    users = [make_user(f"user{i:03}", is_active=i % 10 != 0) for i in range(100)]
+    store.add_many(users)
+    inactive = store.search(is_active=False, limit=100)
+    assert {user.username for user in inactive} == {f"user{i:03}" for i in range(0, 100, 10)}
+    assert len(store.search(is_active=True, limit=20)) == 20
+
+    store.update(users[1].id, {"is_active": False})
+    assert len(store.search(is_active=False, limit=100)) == 11
+    assert len(store.search(is_active=True, limit=100)) == 89
+
+
+def test_search_during_renames_does_not_fail():
+    store = InMemoryUserStore()
+    users = [make_user(f"user{i:04}") for i in range(500)]
+    store.add_many(users)
+    stop = threading.Event()
+    errors = []
+
+    def rename():
+        generation = 0
+        while not stop.is_set():
+            generation += 1
+            for user in users[:50]:
+                store.update(user.id, {"username": f"user{user.id}-{generation}"})
+
+    writer = threading.Thread(target=rename)
+    writer.start()
+    try:
+        for _ in range(200):
+            try:
+                store.search(username_prefix="user", limit=1000)
+            except Exception as e:  # noqa: BLE001 - any error fails the test
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+    assert errors == []